@@ -0,0 +1,144 @@
+import os
+import math
+import time
+import asyncio
+import weakref
+from collections import OrderedDict, deque
+from metrics import metrics
+
+# Concurrent agent loops per worker process; further requests wait in a queue.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", 8))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 32))
+CHAT_MAX_QUEUED_PER_USER = int(os.getenv("CHAT_MAX_QUEUED_PER_USER", 2))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", 20))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after, reason):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps the chat turns running at once in this process.
+
+    Requests beyond `max_concurrency` wait in per-user FIFO queues that are
+    served round-robin, so one user firing many requests can't starve the
+    others. A request is rejected (AdmissionRejected, with a Retry-After
+    estimate) when the queue is full, its user already has
+    `max_queued_per_user` waiting, or it waited longer than `timeout`.
+    """
+
+    def __init__(self, max_concurrency=CHAT_MAX_CONCURRENCY, max_queue=CHAT_MAX_QUEUE,
+                 max_queued_per_user=CHAT_MAX_QUEUED_PER_USER, timeout=CHAT_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self._queues = OrderedDict()
+        # Moving average of how long a turn holds its slot, for Retry-After.
+        self._hold_seconds = 10.0
+
+    def retry_after(self):
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, min(60, math.ceil(waves * self._hold_seconds)))
+
+    def stats(self):
+        return {"active": self.active, "queued": self.queued, "users_waiting": len(self._queues),
+                "retry_after": self.retry_after()}
+
+    def _reject(self, reason):
+        metrics.incr("admission_rejected")
+        return AdmissionRejected(self.retry_after(), reason)
+
+    async def acquire(self, user_id):
+        """Waits for a slot and returns its release callable (idempotent)."""
+        started = time.perf_counter()
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            metrics.observe("admission_wait_seconds", 0.0)
+            return self._slot(started)
+
+        queue = self._queues.get(user_id)
+        if self.queued >= self.max_queue:
+            raise self._reject("Chat queue is full")
+        if queue is not None and len(queue) >= self.max_queued_per_user:
+            raise self._reject("Too many chat requests waiting for this user")
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        queue.append(future)
+        self.queued += 1
+        metrics.observe("admission_queue_depth", self.queued)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as we gave up; pass it on.
+                self._release()
+            else:
+                future.cancel()
+                self._discard(user_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.incr("admission_timeouts")
+                raise self._reject("Timed out waiting for a chat slot")
+            raise
+        metrics.observe("admission_wait_seconds", time.perf_counter() - started)
+        return self._slot(time.perf_counter())
+
+    def _slot(self, granted):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._release(granted)
+        return release
+
+    def _discard(self, user_id, future):
+        queue = self._queues.get(user_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self.queued -= 1
+        if not queue:
+            del self._queues[user_id]
+
+    def _release(self, granted=None):
+        if granted is not None:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - granted)
+        while self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                # Round-robin: this user goes behind everyone else waiting.
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not future.done():
+                # The slot passes straight to the waiter; `active` is unchanged.
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+async def admitted(frames, release):
+    """Yields `frames`, releasing the admission slot when the stream ends."""
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        release()
+
+
+def admitted_stream(frames, release):
+    stream = admitted(frames, release)
+    # A response cancelled before its body starts never runs the generator's
+    # finally; release the slot when the generator is dropped instead.
+    weakref.finalize(stream, release)
+    return stream
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from index_versions import aget_document_versions
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.93))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 500))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 6 * 3600))
+
+
+class CachedAnswer:
+    def __init__(self, question, frames, answer, doc_versions, wipe_epoch):
+        self.question = question
+        self.frames = frames
+        self.answer = answer
+        self.doc_versions = doc_versions
+        self.wipe_epoch = wipe_epoch
+        self.created_at = time.time()
+
+
+class SemanticAnswerCache:
+    """Replays first-turn answers for questions that embed close to a past one.
+
+    Entries are kept in LRU order, capped at `max_entries` and expire after
+    `ttl` seconds. Each entry remembers the version of every document its
+    answer was built from (see index_versions); a hit is only served if none
+    of those documents has been rewritten or deleted since.
+    """
+
+    def __init__(self, redis_client, threshold=ANSWER_CACHE_THRESHOLD,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL_SECONDS):
+        self.redis = redis_client
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._vectors = {}
+        self._next_id = 0
+        self._matrix = None
+        self._matrix_ids = []
+
+    @staticmethod
+    def normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild_matrix(self):
+        self._matrix_ids = list(self._entries.keys())
+        if self._matrix_ids:
+            self._matrix = np.stack([self._vectors[i] for i in self._matrix_ids])
+        else:
+            self._matrix = None
+
+    def _drop(self, entry_id):
+        self._entries.pop(entry_id, None)
+        self._vectors.pop(entry_id, None)
+        self._matrix = None
+
+    async def lookup(self, vector):
+        vector = self.normalize(vector)
+        with self._lock:
+            if not self._entries:
+                return None
+            if self._matrix is None:
+                self._rebuild_matrix()
+
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = self._matrix_ids[best]
+            entry = self._entries[entry_id]
+            if time.time() - entry.created_at > self.ttl:
+                self._drop(entry_id)
+                return None
+            self._entries.move_to_end(entry_id)
+
+        if not await self._is_current(entry):
+            with self._lock:
+                self._drop(entry_id)
+            return None
+        return entry
+
+    async def _is_current(self, entry):
+        try:
+            versions, wipe_epoch = await aget_document_versions(self.redis, entry.doc_versions.keys())
+        except Exception as e:
+            print(f"Answer cache validation failed, treating as miss: {e}")
+            return False
+        return wipe_epoch == entry.wipe_epoch and versions == entry.doc_versions
+
+    async def store(self, vector, question, frames, answer, doc_ids):
+        try:
+            doc_versions, wipe_epoch = await aget_document_versions(self.redis, doc_ids)
+        except Exception as e:
+            print(f"Answer cache could not read document versions, not caching: {e}")
+            return
+
+        entry = CachedAnswer(question, frames, answer, doc_versions, wipe_epoch)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._vectors[entry_id] = self.normalize(vector)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries}
@@ -1,37 +1,49 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
-from starlette.responses import JSONResponse
-import jwt
-import pymongo
 from bson import ObjectId
 from fastapi import Depends
-from app import get_chat_agent, get_retriever
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage, messages_to_dict, messages_from_dict
+from app import get_chat_agent, get_retriever, run_cpu_bound, warm_up_models, aembed_query
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.documents import Document
 import uvicorn
-import json
 import uuid
+import time
+import asyncio
+from contextlib import asynccontextmanager
 import shutil
 import os
-import pymupdf4llm
-from utils import RagProcessor
+from utils import RagProcessor, RotatingGroqChat
+from segmenter import TagSegmenter
+from session_store import RedisSessionStore
+from summarizer import RollingSummarizer, HISTORY_SUMMARY_ENABLED
+from metrics import metrics
+from answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from index_versions import arecord_document_changes, arecord_index_wipe
+from parents import add_parents, parent_ids, delete_parents
+from request_context import retrieved_doc_ids, active_prefetch, session_working_set, current_turn, mark_turn_uncacheable
+from working_set import WorkingSet, WorkingSetStore, WORKING_SET_ENABLED
+from prefetch import SpeculativePrefetch, SPECULATIVE_PREFETCH_ENABLED
+from registry import registry
+from auth import AuthMiddleware, UserCache
+from frames import merge_frames, write_frames
+from admission import AdmissionController, AdmissionRejected, admitted_stream
+from connections import create_async_redis, create_redis, create_mongo_client, check_health
 from dotenv import load_dotenv
 from app import POSTGRES_CONNECTION_STRING
 import psycopg2
-import chromadb
 
 
-import redis
 import pickle
 load_dotenv()
 
-redis_host = os.getenv('REDIS_HOST', 'localhost')
-redis_port = int(os.getenv('REDIS_PORT', 6379))
-redis_client = redis.Redis(host=redis_host, port=redis_port, db=0, decode_responses=False)
+redis_client = create_async_redis()
+session_store = RedisSessionStore(redis_client)
+answer_cache = SemanticAnswerCache(redis_client) if ANSWER_CACHE_ENABLED else None
+working_set_store = WorkingSetStore(redis_client) if WORKING_SET_ENABLED else None
+chat_admission = AdmissionController()
 
 class QueueStatus(BaseModel):
     queue_size: int
@@ -55,54 +67,56 @@ class ChatRequest(BaseModel):
 
 ENVIRONMENT = os.getenv("ENV", "development")
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 
 # Database Connection
 try:
-    mongo_client = pymongo.MongoClient(MONGODB_URI)
+    mongo_client = create_mongo_client()
     db = mongo_client.get_database(name="wikinitt")
     users_collection = db["users"]
     print("Connected to MongoDB")
 except Exception as e:
     print(f"Failed to connect to MongoDB: {e}")
+    mongo_client = None
     users_collection = None
 
-retriever = get_retriever()
+# Set by load_agent() during startup, so importing this module stays cheap.
+retriever = None
+llm_with_tools = None
+tools_map = {}
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ):
-        # Check for Authorization header
-        auth_header = request.headers.get("Authorization")
-        
-        request.state.user_id = None
-        
-        if auth_header:
-            try:
-                # Extract token
-                scheme, token = auth_header.split()
-                if scheme.lower() != "bearer":
-                    raise HTTPException(status_code=403, detail="Invalid authentication scheme")
-                
-                # Decode token
-                payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-                user_id = payload.get("user_id")
-                
-                if user_id:
-                     request.state.user_id = user_id
-                else:
-                     return JSONResponse(status_code=403, content={"detail": "Invalid token payload"})
-                     
-            except (ValueError, jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
-                print(f"Auth failed: {e}")
-                return JSONResponse(status_code=403, content={"detail": "Invalid authentication token"})
-        
-        response = await call_next(request)
-        return response
+async def warm_up():
+    # Runs after the server is already accepting requests; anything a request
+    # needs before this gets to it is loaded on demand by the registry.
+    async def warm_models():
+        try:
+            await run_cpu_bound(warm_up_models)
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+
+    jobs = [warm_models()]
+    if llm_with_tools:
+        # Open keep-alive connections for every Groq key.
+        jobs.append(llm_with_tools.awarm_up())
+    await asyncio.gather(*jobs)
+    print(f"Startup stats: {registry.stats()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(load_agent)
+    registry.mark_ready()
+    if retriever and retriever.lexical_index is not None:
+        # Loads the BM25 index from Postgres, then follows document changes.
+        # It blocks on XREAD from its own thread, so it gets its own client.
+        retriever.lexical_index.start(create_redis(max_connections=2, socket_timeout=10))
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    yield
+    await redis_client.aclose()
+    if mongo_client is not None:
+        await mongo_client.close()
 
 app = FastAPI(
-    root_path="/chat" if ENVIRONMENT == "production" else ""
+    root_path="/chat" if ENVIRONMENT == "production" else "",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -113,7 +127,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(AuthMiddleware)
+app.add_middleware(AuthMiddleware, secret=JWT_SECRET)
 
 # Dependencies
 async def get_current_user(request: Request):
@@ -122,32 +136,40 @@ async def get_current_user(request: Request):
         raise HTTPException(status_code=403, detail="Not authenticated")
     return user_id
 
+async def find_user(user_id):
+    return await users_collection.find_one({"_id": ObjectId(user_id)}, {"isAdmin": 1})
+
+# Role changes take up to ADMIN_CACHE_TTL_SECONDS to apply.
+admin_users = UserCache(find_user)
+
 async def get_admin_user(user_id: str = Depends(get_current_user)):
     if users_collection is None:
         raise HTTPException(status_code=500, detail="Database connection unavailable")
-    print("user id is: ", user_id)
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if not user:
-             raise HTTPException(status_code=403, detail="User not found")
-        
-        if not user.get("isAdmin", False):
-             raise HTTPException(status_code=403, detail="Requires admin privileges")
-             
-        return user
+        user = await admin_users.get(user_id)
     except Exception as e:
         print(f"Admin check failed: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error during auth check")
 
-print("Initializing Agent...")
-try:
-    llm_with_tools, tools = get_chat_agent()
-    tools_map = {t.name: t for t in tools}
-    print("Agent Initialized Successfully.")
-except Exception as e:
-    print(f"Failed to initialize agent: {e}")
-    llm_with_tools = None
-    tools_map = {}
+    if not user:
+        raise HTTPException(status_code=403, detail="User not found")
+    if not user.get("isAdmin", False):
+        raise HTTPException(status_code=403, detail="Requires admin privileges")
+    return user
+
+def load_agent():
+    # Loads the embedder and opens Chroma / Postgres; run in a thread.
+    global retriever, llm_with_tools, tools_map
+    retriever = get_retriever()
+    print("Initializing Agent...")
+    try:
+        llm_with_tools, tools = get_chat_agent(redis_client)
+        tools_map = {t.name: t for t in tools}
+        print("Agent Initialized Successfully.")
+    except Exception as e:
+        print(f"Failed to initialize agent: {e}")
+        llm_with_tools = None
+        tools_map = {}
 
 SYSTEM_MESSAGE = SystemMessage(content="""You are WikiNITT, an intelligent and deep-thinking AI assistant for NIT Trichy.
 
@@ -173,150 +195,342 @@ PROCESS:
 - **Phase 4: Final Answer**: Provide the final response to the user OUTSIDE the `<thinking>` tags.
 """)
 
-async def chat_generator(user_input: str, session_id: str):
-    if not llm_with_tools:
-        yield json.dumps({"error": "Agent not initialized"}) + "\n"
-        return
-
-    redis_key = f"session:{session_id}"
-    
-    raw_history = redis_client.get(redis_key)
-    if raw_history:
+# Inline tags the model may emit, mapped to the NDJSON frame type their
+# contents are streamed as. Anything outside these tags is a text_chunk.
+STREAM_TAGS = {"thinking": "thought_chunk"}
+
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", 4))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 0.25))
+# Wall-clock budget for one chat turn, and the part of it kept for the
+# final answer (no searches start once less than this is left).
+CHAT_LATENCY_BUDGET_SECONDS = float(os.getenv("CHAT_LATENCY_BUDGET_SECONDS", 25))
+CHAT_BUDGET_ANSWER_RESERVE_SECONDS = float(os.getenv("CHAT_BUDGET_ANSWER_RESERVE_SECONDS", 6))
+
+BUDGET_EXHAUSTED_MESSAGE = SystemMessage(content=(
+    "The time budget for this reply is almost used up. Do not call any more tools: "
+    "give your final answer now using the information already retrieved, and say briefly "
+    "if something could not be looked up."
+))
+BUDGET_FALLBACK_ANSWER = "Sorry, I ran out of time looking this up. Please try asking again, perhaps more specifically."
+
+async def execute_tool_calls(tool_calls, results):
+    # Runs every tool call of one model turn concurrently (at most
+    # TOOL_CONCURRENCY at a time) and yields a status line as each one starts
+    # and finishes. results[i] receives the ToolMessage for tool_calls[i], so
+    # the order the model sees does not depend on which search finished first.
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+    events = asyncio.Queue()
+
+    async def run_tool_call(index, tool_call):
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
         try:
-            chat_history = messages_from_dict(json.loads(raw_history))
-        except Exception as e:
-            print(f"Error loading history for {session_id}: {e}")
-            chat_history = []
-    else:
-        chat_history = []
-
-    messages = [SYSTEM_MESSAGE] + chat_history + [HumanMessage(content=user_input)]
-    
+            if tool_name not in tools_map:
+                results[index] = ToolMessage(
+                    tool_call_id=tool_call["id"],
+                    content=f"Error: Tool '{tool_name}' not found."
+                )
+                return
+
+            async with semaphore:
+                query = tool_args.get('query', '...')
+                await events.put(f"Searching: {query}")
+                try:
+                    tool_result = await tools_map[tool_name].ainvoke(tool_args)
+                except Exception as tool_err:
+                    mark_turn_uncacheable()
+                    tool_result = f"Error executing tool: {tool_err}"
+
+                results[index] = ToolMessage(
+                    tool_call_id=tool_call["id"],
+                    content=str(tool_result)
+                )
+                await events.put(f"Finished searching: {query}")
+        finally:
+            await events.put(None)
+
+    tasks = [asyncio.create_task(run_tool_call(i, tc)) for i, tc in enumerate(tool_calls)]
+    pending = len(tasks)
+    try:
+        while pending:
+            event = await events.get()
+            if event is None:
+                pending -= 1
+            else:
+                yield event
+    finally:
+        cancelled = sum(1 for task in tasks if not task.done())
+        if cancelled:
+            metrics.incr("tool_calls_cancelled", cancelled)
+        for task in tasks:
+            task.cancel()
+
+async def agent_loop(messages, turn):
+    # Runs the model/tool loop, yielding frame dicts (see frames.py). The final
+    # answer text is left in turn["answer"]; turn["error"] is set if it failed.
+    # turn["deadline"] (perf_counter time) bounds the loop: once less than
+    # CHAT_BUDGET_ANSWER_RESERVE_SECONDS remain, searches are skipped and the
+    # model is made to answer. Per-step timings go to turn["steps"].
+    deadline = turn.get("deadline") or time.perf_counter() + CHAT_LATENCY_BUDGET_SECONDS
+    steps = turn.setdefault("steps", [])
+    force_answer = False
     try:
         while True:
             full_response = None
+            step = {"llm_seconds": 0.0, "tool_seconds": 0.0, "tool_calls": 0}
+            steps.append(step)
+            step_started = time.perf_counter()
+
+            if not force_answer and deadline - step_started < CHAT_BUDGET_ANSWER_RESERVE_SECONDS:
+                force_answer = turn["budget_forced"] = True
+                messages.append(BUDGET_EXHAUSTED_MESSAGE)
+                metrics.incr("agent_budget_forced_answers")
+            # tool_choice="none" overrides the bound tools for this call.
+            llm_kwargs = {"tool_choice": "none"} if force_answer else {}
+
+            segmenter = TagSegmenter(STREAM_TAGS)
             
-            buffer = ""
-            is_thinking = False
-            
-            for chunk in llm_with_tools.stream(messages):
-                if full_response is None:
-                    full_response = chunk
-                else:
-                    full_response += chunk
-                
-                content = chunk.content
-                if content and isinstance(content, str):
-                    buffer += content
-                    
-                    while True:
-                        if is_thinking:
-                            end_tag = "</thinking>"
-                            if end_tag in buffer:
-                                thought, rest = buffer.split(end_tag, 1)
-                                yield json.dumps({"type": "thought_chunk", "content": thought}) + "\n"
-                                buffer = rest
-                                is_thinking = False
-                            else:
-                                # Check for partial end tag at the end
-                                match_len = 0
-                                for i in range(1, len(end_tag)):
-                                    if buffer.endswith(end_tag[:i]):
-                                        match_len = i
-                                
-                                if match_len > 0:
-                                    to_yield = buffer[:-match_len]
-                                    buffer = buffer[-match_len:]
-                                    if to_yield:
-                                        yield json.dumps({"type": "thought_chunk", "content": to_yield}) + "\n"
-                                else:
-                                    yield json.dumps({"type": "thought_chunk", "content": buffer}) + "\n"
-                                    buffer = ""
-                                break
-                        else:
-                            start_tag = "<thinking>"
-                            if start_tag in buffer:
-                                text, rest = buffer.split(start_tag, 1)
-                                if text:
-                                    yield json.dumps({"type": "text_chunk", "content": text}) + "\n"
-                                buffer = rest
-                                is_thinking = True
-                            else:
-                                # Check for partial start tag at the end
-                                match_len = 0
-                                for i in range(1, len(start_tag)):
-                                    if buffer.endswith(start_tag[:i]):
-                                        match_len = i
-                                
-                                if match_len > 0:
-                                    to_yield = buffer[:-match_len]
-                                    buffer = buffer[-match_len:]
-                                    if to_yield:
-                                        yield json.dumps({"type": "text_chunk", "content": to_yield}) + "\n"
-                                else:
-                                    yield json.dumps({"type": "text_chunk", "content": buffer}) + "\n"
-                                    buffer = ""
-                                break
+            try:
+                async for chunk in llm_with_tools.astream(messages, **llm_kwargs):
+                    if full_response is None:
+                        full_response = chunk
+                    else:
+                        full_response += chunk
+
+                    content = chunk.content
+                    if content and isinstance(content, str):
+                        for kind, text in segmenter.feed(content):
+                            yield {"type": kind, "content": text}
+            except asyncio.CancelledError:
+                # Closing the stream drops the Groq connection mid-generation.
+                metrics.incr("llm_streams_cancelled")
+                raise
             
-            # Flush remaining buffer
-            if buffer:
-                if is_thinking:
-                    yield json.dumps({"type": "thought_chunk", "content": buffer}) + "\n"
-                else:
-                    yield json.dumps({"type": "text_chunk", "content": buffer}) + "\n"
+            # Flush a partial tag held back at the end of the stream
+            for kind, text in segmenter.flush():
+                yield {"type": kind, "content": text}
 
             messages.append(full_response)
+            step["llm_seconds"] = time.perf_counter() - step_started
             
-            if full_response.tool_calls:
+            if full_response.tool_calls and not force_answer:
+                step["tool_calls"] = len(full_response.tool_calls)
+                turn["tool_calls"] = turn.get("tool_calls", 0) + len(full_response.tool_calls)
                 if len(messages) > 30:
-                    yield json.dumps({"type": "error", "content": "Max recursion limit reached."}) + "\n"
+                    turn["error"] = True
+                    yield {"type": "error", "content": "Max recursion limit reached."}
                     return
 
-                for tool_call in full_response.tool_calls:
-                    tool_name = tool_call["name"]
-                    tool_args = tool_call["args"]
-                    
-                    if tool_name in tools_map:
-                        yield json.dumps({"type": "status", "content": f"Searching: {tool_args.get('query', '...')}"}) + "\n"
-                        
-                        try:
-                            # Execute tool
-                            tool_result = tools_map[tool_name].invoke(tool_args)
-                        except Exception as tool_err:
-                            tool_result = f"Error executing tool: {tool_err}"
-                        
-                        messages.append(ToolMessage(
-                            tool_call_id=tool_call["id"],
-                            content=str(tool_result)
-                        ))
-                    else:
-                        messages.append(ToolMessage(
+                tool_messages = [None] * len(full_response.tool_calls)
+                tools_started = time.perf_counter()
+                if deadline - tools_started < CHAT_BUDGET_ANSWER_RESERVE_SECONDS:
+                    # Out of time: answer the calls without searching.
+                    metrics.incr("agent_budget_skipped_tool_calls", len(tool_messages))
+                    for i, tool_call in enumerate(full_response.tool_calls):
+                        tool_messages[i] = ToolMessage(
                             tool_call_id=tool_call["id"],
-                            content=f"Error: Tool '{tool_name}' not found."
-                        ))
+                            content="Skipped: the response time budget is used up. Answer with what you have."
+                        )
+                else:
+                    async for status in execute_tool_calls(full_response.tool_calls, tool_messages):
+                        yield {"type": "status", "content": status}
+                    remaining = max(0.0, deadline - time.perf_counter())
+                    tool_messages[-1].content += f"\n\n[Time left to answer: about {remaining:.0f}s.]"
+                step["tool_seconds"] = time.perf_counter() - tools_started
+                messages.extend(tool_messages)
                 continue
             
-            else:
-                chat_history.append(HumanMessage(content=user_input))
-                chat_history.append(AIMessage(content=str(full_response.content)))
-                
-                try:
-                    serialized_history = json.dumps(messages_to_dict(chat_history))
-                    redis_client.setex(redis_key, 86400, serialized_history)
-                except Exception as e:
-                    print(f"Error saving history to Redis: {e}")
-                    
-                break
+            turn["answer"] = str(full_response.content)
+            if not turn["answer"].strip() and force_answer:
+                # The model tried to keep searching; don't end on an empty reply.
+                turn["answer"] = BUDGET_FALLBACK_ANSWER
+                yield {"type": "text_chunk", "content": BUDGET_FALLBACK_ANSWER}
+            metrics.observe("agent_tool_calls_per_turn", turn.get("tool_calls", 0))
+            break
 
     except Exception as e:
         print(f"Error processing chat: {e}")
-        yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+        turn["error"] = True
+        yield {"type": "error", "content": str(e)}
+    finally:
+        record_turn_budget(turn, deadline)
+
+def record_turn_budget(turn, deadline):
+    steps = turn.get("steps", [])
+    metrics.observe("agent_steps_per_turn", len(steps))
+    for step in steps:
+        metrics.observe("agent_step_llm_seconds", step["llm_seconds"])
+        if step["tool_calls"]:
+            metrics.observe("agent_step_tool_seconds", step["tool_seconds"])
+    overrun = time.perf_counter() - deadline
+    turn["budget_overrun"] = max(0.0, overrun)
+    if overrun > 0:
+        metrics.incr("agent_budget_overruns")
+        metrics.observe("agent_budget_overrun_seconds", overrun)
+
+async def chat_generator(user_input: str, session_id: str):
+    if not llm_with_tools:
+        yield {"error": "Agent not initialized"}
+        return
+
+    started = time.perf_counter()
+
+    try:
+        if HISTORY_SUMMARY_ENABLED:
+            chat_history, tokens_saved = await history_summarizer.load(session_id)
+            if tokens_saved:
+                print(f"History compaction saved ~{tokens_saved} prompt tokens for {session_id}")
+        else:
+            chat_history = await session_store.load(session_id)
+    except Exception as e:
+        print(f"Error loading history for {session_id}: {e}")
+        chat_history = []
+
+    # Only first turns are cached: later answers depend on the conversation.
+    question_vector = None
+    if answer_cache and not chat_history and retriever:
+        try:
+            question_vector = await aembed_query(user_input)
+            cached = await answer_cache.lookup(question_vector)
+        except Exception as e:
+            print(f"Answer cache lookup failed: {e}")
+            cached = None
+        metrics.observe("answer_cache_lookup_seconds", time.perf_counter() - started)
+
+        if cached:
+            metrics.incr("answer_cache_hits")
+            for frame in cached.frames:
+                yield frame
+            await save_turn(session_id, user_input, cached.answer)
+            if working_set_store:
+                # Follow-ups to a cached answer can still use its documents.
+                seeded = WorkingSet()
+                seeded.add(list(cached.doc_versions))
+                await save_working_set(session_id, seeded)
+            metrics.observe("answer_cache_hit_seconds", time.perf_counter() - started)
+            return
+        metrics.incr("answer_cache_misses")
+
+    messages = [SYSTEM_MESSAGE] + chat_history + [HumanMessage(content=user_input)]
+    turn = {"answer": None, "error": False, "deadline": started + CHAT_LATENCY_BUDGET_SECONDS}
+    frames = []
+    doc_ids = []
+    retrieved_doc_ids.set(doc_ids)
+    current_turn.set(turn)
+
+    # Parents this session's searches returned in earlier turns; the search
+    # tool re-scores them before searching the index again.
+    working_set = None
+    if working_set_store:
+        try:
+            working_set = await working_set_store.load(session_id) if chat_history else None
+        except Exception as e:
+            print(f"Error loading working set for {session_id}: {e}")
+        if working_set is None:
+            working_set = WorkingSet()
+        session_working_set.set(working_set)
+
+    # Start searching the raw message while the model decides what to search.
+    # Only on first turns: follow-ups ("what about his email?") make poor queries.
+    prefetch = None
+    search_tool = tools_map.get("search_nitt_data")
+    if SPECULATIVE_PREFETCH_ENABLED and not chat_history and search_tool is not None and search_tool.metadata:
+        prefetch = SpeculativePrefetch(search_tool.metadata["search"], aembed_query)
+        prefetch.start(user_input)
+        active_prefetch.set(prefetch)
+
+    try:
+        async for frame in agent_loop(messages, turn):
+            if question_vector is not None:
+                frames.append(frame)
+            yield frame
+    except asyncio.CancelledError:
+        # The client went away (see stream_until_disconnect): nothing is saved,
+        # so the next turn doesn't see a half-written answer.
+        metrics.incr("chat_turns_cancelled")
+        print(f"Chat turn for {session_id} cancelled after {time.perf_counter() - started:.2f}s")
+        raise
+    finally:
+        if prefetch:
+            prefetch.close()
+
+    steps = turn["steps"]
+    print(f"Chat turn for {session_id}: {len(steps)} steps, {turn.get('tool_calls', 0)} tool calls, "
+          f"{time.perf_counter() - started:.2f}s of {CHAT_LATENCY_BUDGET_SECONDS:.0f}s budget"
+          + (f" (over by {turn['budget_overrun']:.2f}s)" if turn["budget_overrun"] else ""))
+
+    if turn["answer"] is None:
+        return
+
+    await save_turn(session_id, user_input, turn["answer"])
+    if working_set is not None:
+        await save_working_set(session_id, working_set)
+
+    # Answers cut short by the budget, or built on a failed or empty search,
+    # aren't worth replaying from the cache.
+    if (question_vector is not None and doc_ids and not turn["error"]
+            and not turn.get("budget_forced") and not turn.get("uncacheable")):
+        await answer_cache.store(question_vector, user_input, merge_frames(frames), turn["answer"], doc_ids)
+        metrics.observe("answer_cache_miss_seconds", time.perf_counter() - started)
+
+async def save_turn(session_id, user_input, answer):
+    try:
+        await session_store.append_turn(session_id, [
+            HumanMessage(content=user_input),
+            AIMessage(content=answer)
+        ])
+    except Exception as e:
+        print(f"Error saving history to Redis: {e}")
+        return
+    if HISTORY_SUMMARY_ENABLED:
+        # Folds older turns into the summary off the request path; the next
+        # turn's history_summarizer.load() picks it up.
+        history_summarizer.schedule_fold(session_id)
+
+async def save_working_set(session_id, working_set):
+    try:
+        await working_set_store.save(session_id, working_set)
+    except Exception as e:
+        print(f"Error saving working set for {session_id}: {e}")
 
 GROQ_API_KEYS = []
 if os.getenv("GROQ_API_KEYS"):
     GROQ_API_KEYS = os.getenv("GROQ_API_KEYS", "").split(",")
 
 rag_processor = RagProcessor(GROQ_API_KEYS)
+history_summarizer = RollingSummarizer(RotatingGroqChat(api_keys=GROQ_API_KEYS, temperature=0), session_store)
+
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    if answer_cache:
+        counters = snapshot["counters"]
+        hits = counters.get("answer_cache_hits", 0)
+        lookups = hits + counters.get("answer_cache_misses", 0)
+        snapshot["answer_cache"] = dict(answer_cache.stats(), hit_rate=hits / lookups if lookups else 0.0)
+    counters = snapshot["counters"]
+    prefetch_hits = counters.get("prefetch_hits", 0)
+    prefetch_lookups = prefetch_hits + counters.get("prefetch_misses", 0)
+    snapshot["prefetch"] = {
+        "hit_rate": prefetch_hits / prefetch_lookups if prefetch_lookups else 0.0,
+        "time_saved_seconds": snapshot["summaries"].get("prefetch_time_saved_seconds", {}).get("sum", 0.0),
+    }
+    snapshot["admission"] = chat_admission.stats()
+    snapshot["startup"] = registry.stats()
+    return snapshot
+
+@app.get("/health")
+async def health():
+    checks = {"redis": redis_client.ping}
+    if mongo_client is not None:
+        checks["mongo"] = lambda: mongo_client.admin.command("ping")
+    status, ok = await check_health(checks)
+    if mongo_client is None:
+        status["mongo"] = {"ok": False, "error": "client not created"}
+        ok = False
+    status["agent"] = {"ok": llm_with_tools is not None}
+    body = {"status": "ok" if ok else "unavailable", "checks": status}
+    return body if ok else JSONResponse(status_code=503, content=body)
 
 @app.get("/admin/documents", dependencies=[Depends(get_admin_user)])
 async def list_documents(page: int = 1, limit: int = 20, search: str = None):
@@ -325,10 +539,12 @@ async def list_documents(page: int = 1, limit: int = 20, search: str = None):
     
     store = retriever.docstore
     
-    all_keys = list(store.yield_keys())
+    # The docstore and Chroma clients are blocking; admin calls run them in
+    # threads so chat streams on this worker keep flowing.
+    all_keys = await asyncio.to_thread(lambda: list(store.yield_keys()))
     current_docs = []
     
-    retrieved_docs = store.mget(all_keys)
+    retrieved_docs = await asyncio.to_thread(store.mget, all_keys)
     
     for i, doc in enumerate(retrieved_docs):
         if doc:
@@ -362,6 +578,40 @@ async def list_documents(page: int = 1, limit: int = 20, search: str = None):
         "pages": (total_docs + limit - 1) // limit if limit > 0 else 1
     }
 
+def pdf_to_markdown(path):
+    print("Extracting base text with pymupdf4llm...")
+    import pymupdf4llm
+    md_text = pymupdf4llm.to_markdown(path)
+    
+    try:
+        print("Extracting tables with GMFT...")
+        from gmft.pdf_bindings import PyPDFium2Document
+        from gmft.auto import AutoTableFormatter
+        
+        doc_gmft = PyPDFium2Document(path)
+        formatter = registry.get("table_formatter", AutoTableFormatter)
+        tables = formatter.extract(doc_gmft)
+        
+        if tables:
+            table_mds = []
+            for table in tables:
+                df = table.df
+                if not df.empty:
+                    table_mds.append(df.to_markdown(index=False))
+            
+            if table_mds:
+                md_text += "\n\n## Detected Tables (High Quality Extraction)\n\n"
+                md_text += "\n\n".join(table_mds)
+                print(f"Appended {len(table_mds)} high-quality tables.")
+        else:
+            print("No tables detected by GMFT.")
+            
+        doc_gmft.close()
+
+    except Exception as e:
+        print(f"GMFT table extraction failed (using base text only): {e}")
+    return md_text
+
 @app.post("/admin/parse-pdf", dependencies=[Depends(get_admin_user)])
 async def parse_pdf(file: UploadFile = File(...)):
     temp_file = f"temp_{uuid.uuid4()}.pdf"
@@ -369,36 +619,8 @@ async def parse_pdf(file: UploadFile = File(...)):
         with open(temp_file, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             
-        print("Extracting base text with pymupdf4llm...")
-        md_text = pymupdf4llm.to_markdown(temp_file)
-        
-        try:
-            print("Extracting tables with GMFT...")
-            from gmft.pdf_bindings import PyPDFium2Document
-            from gmft.auto import AutoTableFormatter
-            
-            doc_gmft = PyPDFium2Document(temp_file)
-            formatter = AutoTableFormatter()
-            tables = formatter.extract(doc_gmft)
-            
-            if tables:
-                table_mds = []
-                for table in tables:
-                    df = table.df
-                    if not df.empty:
-                        table_mds.append(df.to_markdown(index=False))
-                
-                if table_mds:
-                    md_text += "\n\n## Detected Tables (High Quality Extraction)\n\n"
-                    md_text += "\n\n".join(table_mds)
-                    print(f"Appended {len(table_mds)} high-quality tables.")
-            else:
-                print("No tables detected by GMFT.")
-                
-            doc_gmft.close()
-
-        except Exception as e:
-            print(f"GMFT table extraction failed (using base text only): {e}")
+        # Parsing takes seconds of CPU; keep it off the event loop.
+        md_text = await asyncio.to_thread(pdf_to_markdown, temp_file)
         
         os.remove(temp_file)
         return {"text": md_text}
@@ -425,7 +647,7 @@ async def add_document(doc: AdminDocument, process: bool = False):
     }
     
     if process:
-        processed = rag_processor.process_document(doc.content, doc.source_url)
+        processed = await rag_processor.aprocess_document(doc.content, doc.source_url)
         if processed:
             final_content = processed["content"]
             final_metadata.update(processed["metadata"])
@@ -438,13 +660,12 @@ async def add_document(doc: AdminDocument, process: bool = False):
         metadata=final_metadata
     )
 
-    if len([new_doc]) != len([doc_id]):
-         raise HTTPException(status_code=500, detail="Internal Error: Document/ID mismatch preprocessing.")
     try:
-        if hasattr(retriever, 'aadd_documents'):
-            await retriever.aadd_documents([new_doc])
-        else:
-            retriever.add_documents([new_doc])
+        # Long documents become several parents: doc_id, doc_id#1, ...
+        ids = await asyncio.to_thread(add_parents, retriever, [new_doc], doc_id)
+        # The ID may already exist: bump its version so cached answers built
+        # on the old text are dropped.
+        await arecord_document_changes(redis_client, ids)
     except ValueError as ve:
         raise HTTPException(status_code=500, detail=f"Retriever Error: {str(ve)}")
     except Exception as e:
@@ -458,7 +679,7 @@ async def update_document(doc_id: str, doc: AdminDocument, process: bool = False
         raise HTTPException(status_code=500, detail="Retriever not initialized")
         
     store = retriever.docstore
-    existing = store.mget([doc_id])[0]
+    existing = (await asyncio.to_thread(store.mget, [doc_id]))[0]
     if not existing:
          raise HTTPException(status_code=404, detail="Document not found")
          
@@ -470,7 +691,7 @@ async def update_document(doc_id: str, doc: AdminDocument, process: bool = False
     }
 
     if process:
-        processed = rag_processor.process_document(doc.content, doc.source_url)
+        processed = await rag_processor.aprocess_document(doc.content, doc.source_url)
         if processed:
             final_content = processed["content"]
             final_metadata.update(processed["metadata"])
@@ -483,18 +704,33 @@ async def update_document(doc_id: str, doc: AdminDocument, process: bool = False
         metadata=final_metadata
     )
     
-    try:
-        id_key = getattr(retriever, "id_key", "doc_id")
-        retriever.vectorstore.delete(where={id_key: doc_id})
-    except Exception as e:
-        print(f"Warning: Failed to cleanup vectorstore chunks for {doc_id}: {e}")
+    old_ids = await asyncio.to_thread(parent_ids, retriever, doc_id)
+    await asyncio.to_thread(delete_parents, retriever, old_ids)
 
-    store.mdelete([doc_id]) 
-    
-    retriever.add_documents([new_doc], ids=[doc_id])
+    ids = await asyncio.to_thread(add_parents, retriever, [new_doc], doc_id)
+    await arecord_document_changes(redis_client, sorted(set(old_ids) | set(ids)))
     
     return {"status": "success", "message": "Document updated"}
 
+def truncate_doc_store():
+    with psycopg2.connect(POSTGRES_CONNECTION_STRING) as conn:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE TABLE public.doc_store")
+            print("DEBUG: Truncated public.doc_store")
+        conn.commit()
+
+def wipe_vectorstore():
+    existing_ids = retriever.vectorstore.get()["ids"]
+    
+    if existing_ids:
+        batch_size = 40000 
+        for i in range(0, len(existing_ids), batch_size):
+            batch = existing_ids[i:i + batch_size]
+            retriever.vectorstore.delete(batch)
+        print(f"DEBUG: Deleted {len(existing_ids)} embeddings from Chroma.")
+    else:
+        print("DEBUG: Chroma was already empty.")
+
 @app.delete("/admin/documents/all", dependencies=[Depends(get_admin_user)])
 async def delete_all_documents():
     if not retriever:
@@ -502,27 +738,15 @@ async def delete_all_documents():
     
     try:
         try:
-            with psycopg2.connect(POSTGRES_CONNECTION_STRING) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("TRUNCATE TABLE public.doc_store")
-                    print("DEBUG: Truncated public.doc_store")
-                conn.commit()
+            await asyncio.to_thread(truncate_doc_store)
+            await arecord_index_wipe(redis_client)
         except Exception as pg_e:
             print(f"Postgres Delete Error: {pg_e}")
             raise HTTPException(status_code=500, detail=f"Postgres cleanup failed: {pg_e}")
 
         try:
             print("DEBUG: Attempting to wipe Chroma...")
-            existing_ids = retriever.vectorstore.get()["ids"]
-            
-            if existing_ids:
-                batch_size = 40000 
-                for i in range(0, len(existing_ids), batch_size):
-                    batch = existing_ids[i:i + batch_size]
-                    retriever.vectorstore.delete(batch)
-                print(f"DEBUG: Deleted {len(existing_ids)} embeddings from Chroma.")
-            else:
-                print("DEBUG: Chroma was already empty.")
+            await asyncio.to_thread(wipe_vectorstore)
 
         except Exception as chroma_e:
             print(f"Warning: Failed to cleanup vectorstore: {chroma_e}")
@@ -540,15 +764,9 @@ async def delete_document(doc_id: str):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
     
-    store = retriever.docstore
-    
-    try:
-        id_key = getattr(retriever, "id_key", "doc_id")
-        retriever.vectorstore.delete(where={id_key: doc_id})
-    except Exception as e:
-        print(f"Warning: Failed to cleanup vectorstore chunks for {doc_id}: {e}")
-
-    store.mdelete([doc_id])
+    ids = await asyncio.to_thread(parent_ids, retriever, doc_id)
+    await asyncio.to_thread(delete_parents, retriever, ids)
+    await arecord_document_changes(redis_client, ids)
     
     return {"status": "success", "message": "Document deleted"}
 
@@ -560,26 +778,21 @@ async def delete_documents(request: DeleteDocumentsRequest):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
     
-    store = retriever.docstore
-    ids_to_delete = request.ids
-    
-    if not ids_to_delete:
+    if not request.ids:
          return {"status": "success", "message": "No documents to delete"}
 
-    try:
-        id_key = getattr(retriever, "id_key", "doc_id")
-        for doc_id in ids_to_delete:
-             retriever.vectorstore.delete(where={id_key: doc_id})
-             
-    except Exception as e:
-        print(f"Warning: Failed to cleanup vectorstore chunks during bulk delete: {e}")
+    def delete_all(doc_ids):
+        ids = sorted({parent for doc_id in doc_ids for parent in parent_ids(retriever, doc_id)})
+        delete_parents(retriever, ids)
+        return ids
 
     try:
-        store.mdelete(ids_to_delete)
+        ids_to_delete = await asyncio.to_thread(delete_all, request.ids)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Docstore delete failed: {e}")
+    await arecord_document_changes(redis_client, ids_to_delete)
     
-    return {"status": "success", "message": f"Deleted {len(ids_to_delete)} documents"}
+    return {"status": "success", "message": f"Deleted {len(request.ids)} documents"}
 
 
 @app.post("/admin/crawl", dependencies=[Depends(get_admin_user)])
@@ -594,10 +807,49 @@ async def trigger_crawl(request: CrawlRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat", dependencies=[Depends(get_current_user)])
-async def chat_endpoint(request: ChatRequest):
+async def stream_until_disconnect(http_request: Request, frames):
+    # Runs `frames` in a producer task while a watcher polls the connection;
+    # when the client disconnects the producer is cancelled, which cancels the
+    # Groq stream and any searches it is waiting on.
+    queue = asyncio.Queue()
+    finished = object()
+
+    async def produce():
+        try:
+            async for frame in frames:
+                queue.put_nowait(frame)
+        finally:
+            queue.put_nowait(finished)
+
+    async def watch():
+        while not producer.done():
+            if await http_request.is_disconnected():
+                metrics.incr("chat_disconnects")
+                producer.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    producer = asyncio.create_task(produce())
+    watcher = asyncio.create_task(watch())
+    try:
+        # Chunks are merged into fewer NDJSON frames on the way out.
+        async for data in write_frames(queue, finished):
+            yield data
+        await asyncio.wait({producer})
+        if not producer.cancelled() and producer.exception():
+            raise producer.exception()
+    finally:
+        watcher.cancel()
+        producer.cancel()
+
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest, http_request: Request, user_id: str = Depends(get_current_user)):
+    try:
+        release = await chat_admission.acquire(user_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     return StreamingResponse(
-        chat_generator(request.message, request.session_id), 
+        admitted_stream(stream_until_disconnect(http_request, chat_generator(request.message, request.session_id)), release),
         media_type="application/x-ndjson"
     )
 
@@ -609,23 +861,23 @@ async def get_redis_queue_status():
         dupefilter_key = f"{spider_name}:dupefilter"
         start_urls_key = f"{spider_name}:start_urls"
         
-        queue_type = redis_client.type(queue_key)
+        queue_type = await redis_client.type(queue_key)
         queue_size = 0
         queued_urls = []
         
         raw_items = []
         
         if queue_type == b"zset":
-            queue_size = redis_client.zcard(queue_key)
-            raw_items = redis_client.zrange(queue_key, 0, 49)
+            queue_size = await redis_client.zcard(queue_key)
+            raw_items = await redis_client.zrange(queue_key, 0, 49)
             
         elif queue_type == b"list":
-            queue_size = redis_client.llen(queue_key)
-            raw_items = redis_client.lrange(queue_key, 0, 49)
+            queue_size = await redis_client.llen(queue_key)
+            raw_items = await redis_client.lrange(queue_key, 0, 49)
         
-        processed_count = redis_client.scard(dupefilter_key)
+        processed_count = await redis_client.scard(dupefilter_key)
         
-        scheduled_count = redis_client.llen(start_urls_key)
+        scheduled_count = await redis_client.llen(start_urls_key)
         
         for item in raw_items:
             try:
@@ -667,7 +919,7 @@ async def flush_redis_queue():
             f"{spider_name}:dupefilter",
             f"{spider_name}:start_urls"
         ]
-        redis_client.delete(*keys)
+        await redis_client.delete(*keys)
         return {"status": "success", "message": "Redis queue flushed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to flush Redis: {e}")
@@ -681,7 +933,7 @@ async def add_url_to_queue(request: AddUrlRequest):
         spider_name = "nitt"
         start_urls_key = f"{spider_name}:start_urls"
         
-        redis_client.lpush(start_urls_key, request.url)
+        await redis_client.lpush(start_urls_key, request.url)
         
         return {"status": "success", "message": f"Added {request.url} to queue"}
     except Exception as e:
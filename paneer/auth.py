@@ -0,0 +1,123 @@
+import os
+import time
+from collections import OrderedDict
+import jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from metrics import metrics
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 4096))
+ADMIN_CACHE_TTL_SECONDS = float(os.getenv("ADMIN_CACHE_TTL_SECONDS", 30))
+ADMIN_CACHE_MAX_USERS = 1024
+
+
+class TokenCache:
+    """LRU of verified tokens -> user_id. An entry is dropped once the token's
+    `exp` has passed, so expiry is enforced exactly as jwt.decode would."""
+
+    def __init__(self, max_size=AUTH_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        user_id, exp = entry
+        if exp is not None and exp <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user_id
+
+    def put(self, token, user_id, exp):
+        self._entries[token] = (user_id, exp)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class AuthMiddleware:
+    """Sets request.state.user_id from a Bearer JWT, or answers 403 for a bad
+    token. Requests without an Authorization header pass through with
+    user_id None; routes that need a user check it (get_current_user).
+
+    Plain ASGI rather than BaseHTTPMiddleware, so responses (the /chat
+    stream in particular) go straight to the server without an extra task
+    and memory stream per request.
+    """
+
+    def __init__(self, app, secret, algorithms=("HS256",), cache_size=AUTH_TOKEN_CACHE_SIZE):
+        self.app = app
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.tokens = TokenCache(cache_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["user_id"] = None
+        auth_header = Headers(scope=scope).get("authorization")
+        if auth_header:
+            user_id, error = self.authenticate(auth_header)
+            if error:
+                await JSONResponse(status_code=403, content={"detail": error})(scope, receive, send)
+                return
+            state["user_id"] = user_id
+        await self.app(scope, receive, send)
+
+    def authenticate(self, auth_header):
+        """Returns (user_id, None) or (None, error detail)."""
+        try:
+            scheme, token = auth_header.split()
+        except ValueError:
+            return None, "Invalid authentication token"
+        if scheme.lower() != "bearer":
+            return None, "Invalid authentication scheme"
+
+        user_id = self.tokens.get(token)
+        if user_id is not None:
+            metrics.incr("auth_token_cache_hits")
+            return user_id, None
+
+        metrics.incr("auth_token_cache_misses")
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        except jwt.InvalidTokenError as e:
+            print(f"Auth failed: {e}")
+            return None, "Invalid authentication token"
+        user_id = payload.get("user_id")
+        if not user_id:
+            return None, "Invalid token payload"
+        self.tokens.put(token, user_id, payload.get("exp"))
+        return user_id, None
+
+
+class UserCache:
+    """user_id -> user document (None if there is none), cached for `ttl`
+    seconds. `find_user` is an async lookup; failures aren't cached."""
+
+    def __init__(self, find_user, ttl=ADMIN_CACHE_TTL_SECONDS, max_users=ADMIN_CACHE_MAX_USERS):
+        self.find_user = find_user
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()
+
+    async def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            metrics.incr("admin_lookup_cache_hits")
+            return entry[1]
+
+        metrics.incr("admin_lookup_cache_misses")
+        started = time.perf_counter()
+        user = await self.find_user(user_id)
+        metrics.observe("admin_lookup_seconds", time.perf_counter() - started)
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+        return user
@@ -6,7 +6,6 @@ from typing import List
 from scrapy.exceptions import DropItem
 
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_classic.storage import LocalFileStore
 from langchain_classic.retrievers.parent_document_retriever import ParentDocumentRetriever
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -16,6 +15,10 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
         
 from postgres_store import PostgresByteStore
+from index_versions import record_index_write
+from parents import add_parents
+from key_pool import get_key_pool, key_fingerprint, is_rate_limit_error, retry_after_from_error
+from model_backends import create_embeddings
 from langchain_classic.storage import create_kv_docstore
 from bs4 import BeautifulSoup
 import re
@@ -36,18 +39,20 @@ class SmartRagPipeline:
         text = re.sub(r'Copyright © \d+ National Institute of Technology', '', text)
         return text
 
-    def __init__(self, groq_api_keys, pg_conn_str, chroma_host, chroma_port):
+    def __init__(self, groq_api_keys, pg_conn_str, chroma_host, chroma_port, redis_host='localhost', redis_port=6379):
         self.groq_api_keys = groq_api_keys
-        self.current_key_idx = 0
+        self.key_pool = None
+        self.llms = {}
         
         self.pg_conn_str = pg_conn_str
         self.chroma_host = chroma_host
         self.chroma_port = chroma_port
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.redis_client = None
         
         self.buffer = [] 
         self.BUFFER_SIZE = 5 
-        
-        self.llm = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -55,21 +60,31 @@ class SmartRagPipeline:
             groq_api_keys=crawler.settings.get('GROQ_API_KEYS'),
             pg_conn_str=crawler.settings.get('POSTGRES_CONNECTION_STRING'),
             chroma_host=crawler.settings.get('CHROMA_HOST'),
-            chroma_port=crawler.settings.get('CHROMA_PORT')
+            chroma_port=crawler.settings.get('CHROMA_PORT'),
+            redis_host=crawler.settings.get('REDIS_HOST'),
+            redis_port=crawler.settings.get('REDIS_PORT')
         )
 
-    def _setup_llm(self):
-        """Helper to initialize the LLM with the currently selected key"""
-        current_key = self.groq_api_keys[self.current_key_idx]
-        masked_key = current_key[:4] + "..." + current_key[-4:]
-        logging.info(f"🔑 Initializing LLM with Key Index {self.current_key_idx} ({masked_key})")
+    def _setup_llm(self, api_key):
+        """Helper returning the (cached) LLM for the key picked by the key pool"""
+        llm = self.llms.get(api_key)
+        if llm is not None:
+            return llm
+
+        masked_key = api_key[:4] + "..." + api_key[-4:]
+        logging.info(f"🔑 Initializing LLM with Key {masked_key}")
         
-        self.llm = ChatGroq(
-            api_key=current_key, 
+        http_client, http_async_client = self.key_pool.http_clients(api_key)
+        llm = ChatGroq(
+            api_key=api_key, 
             model_name="llama-3.1-8b-instant", 
             temperature=0,
-            max_retries=0
+            max_retries=0,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
+        self.llms[api_key] = llm
+        return llm
 
     def open_spider(self, spider):
         logging.info("🚀 RAG Pipeline: Initializing Vector DB & LLM...")
@@ -77,7 +92,7 @@ class SmartRagPipeline:
         if not self.groq_api_keys or not isinstance(self.groq_api_keys, list):
             raise ValueError("⚠️ GROQ_API_KEYS must be a list in settings.py!")
 
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = create_embeddings("all-MiniLM-L6-v2")
         
         import chromadb
         client = chromadb.HttpClient(host=self.chroma_host, port=self.chroma_port)
@@ -101,7 +116,13 @@ class SmartRagPipeline:
             parent_splitter=parent_splitter,
         )
 
-        self._setup_llm()
+        # Used to tell the API that the index changed, so cached search
+        # results from before this crawl are not served.
+        import redis
+        self.redis_client = redis.Redis(host=self.redis_host, port=self.redis_port, db=0)
+
+        # Shares per-key rate-limit state with the API and worker via Redis.
+        self.key_pool = get_key_pool(self.groq_api_keys)
 
     def close_spider(self, spider):
         if self.buffer:
@@ -130,24 +151,20 @@ class SmartRagPipeline:
 
     def _call_llm_safe(self, prompt):
         """
-        Executes LLM call with Automatic Key Rotation on 429 Errors.
+        Executes LLM call on the key with the most rate-limit headroom,
+        rescheduling onto another key on 429 Errors.
         """
-        max_attempts = len(self.groq_api_keys) * 2 
+        max_attempts = len(self.key_pool) * 2 
         
         for attempt in range(max_attempts):
+            api_key = self.key_pool.acquire()
             try:
-                return self.llm.invoke(prompt)
+                return self._setup_llm(api_key).invoke(prompt)
                 
             except Exception as e:
-                error_msg = str(e).lower()
-                
-                if "429" in error_msg or "rate_limit" in error_msg or "too many requests" in error_msg:
-                    logging.warning(f"⚠️ Rate Limit hit on Key #{self.current_key_idx}. Rotating...")
-                    
-                    self.current_key_idx = (self.current_key_idx + 1) % len(self.groq_api_keys)
-                    
-                    self._setup_llm()
-                    
+                if is_rate_limit_error(e):
+                    logging.warning(f"⚠️ Rate Limit hit on Key {key_fingerprint(api_key)}. Rescheduling...")
+                    self.key_pool.record_rate_limited(api_key, retry_after_from_error(e))
                     continue
                 else:
                     logging.error(f"❌ LLM Error (Non-RateLimit): {e}")
@@ -200,7 +217,9 @@ class SmartRagPipeline:
 
             logging.info(f"📊 Documents to Index: {len(cleaned_docs_to_index)}")
             if cleaned_docs_to_index:
-                self.retriever.add_documents(cleaned_docs_to_index)
+                # Known parent IDs let the API's lexical index apply just these.
+                doc_ids = add_parents(self.retriever, cleaned_docs_to_index)
+                record_index_write(self.redis_client, doc_ids)
                 logging.info(f"💾 Indexed {len(cleaned_docs_to_index)} documents.")
 
         except Exception as e:
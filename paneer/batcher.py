@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+from metrics import metrics
+
+RERANK_BATCHING_ENABLED = os.getenv("RERANK_BATCHING_ENABLED", "true").lower() == "true"
+RERANK_BATCH_MAX_SIZE = int(os.getenv("RERANK_BATCH_MAX_SIZE", 128))
+RERANK_BATCH_WAIT_MS = float(os.getenv("RERANK_BATCH_WAIT_MS", 5))
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "false").lower() == "true"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", 2))
+
+
+class MicroBatcher:
+    """Merges concurrent calls of a batch function into fewer, larger calls.
+
+    Callers submit a list of items; items from everyone who submits within
+    `max_wait_ms` of the first (or until `max_batch_size` items are waiting)
+    go through one `func(items)` call, run via `runner` (e.g. the CPU pool),
+    and each caller gets back the results for its own items. A single
+    submission is never split, even if it is larger than max_batch_size.
+    """
+
+    def __init__(self, func, runner, max_batch_size, max_wait_ms, name="batch"):
+        self.func = func
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._pending = []
+        self._pending_size = 0
+        self._timer = None
+        # The loop keeps only weak references to tasks; hold running batches.
+        self._tasks = set()
+
+    async def submit(self, items):
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((items, future, time.perf_counter()))
+        self._pending_size += len(items)
+
+        if self._pending_size >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_size = self._pending, [], 0
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        items = [item for submitted, _, _ in batch for item in submitted]
+        started = time.perf_counter()
+        metrics.incr(f"{self.name}_batches")
+        metrics.observe(f"{self.name}_batch_size", len(items))
+        metrics.observe(f"{self.name}_batch_callers", len(batch))
+        for _, _, submitted_at in batch:
+            metrics.observe(f"{self.name}_queue_seconds", started - submitted_at)
+        try:
+            results = await self.runner(self.func, items)
+            metrics.observe(f"{self.name}_run_seconds", time.perf_counter() - started)
+
+            offset = 0
+            for submitted, future, _ in batch:
+                if not future.done():
+                    future.set_result(list(results[offset:offset + len(submitted)]))
+                offset += len(submitted)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            # Every caller gets the error; nothing is left for the task.
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import jwt
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from auth import AuthMiddleware, UserCache
+
+SECRET = "bench-secret"
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    # The BaseHTTPMiddleware version api.py used before auth.AuthMiddleware.
+    async def dispatch(self, request, call_next):
+        auth_header = request.headers.get("Authorization")
+        request.state.user_id = None
+        if auth_header:
+            try:
+                scheme, token = auth_header.split()
+                payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+                user_id = payload.get("user_id")
+                if user_id:
+                    request.state.user_id = user_id
+                else:
+                    return JSONResponse(status_code=403, content={"detail": "Invalid token payload"})
+            except (ValueError, jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+                return JSONResponse(status_code=403, content={"detail": "Invalid authentication token"})
+        return await call_next(request)
+
+
+async def ping(request):
+    return JSONResponse({"user_id": getattr(request.state, "user_id", None)})
+
+
+async def stream(request):
+    async def frames():
+        for i in range(50):
+            yield b'{"type": "text_chunk", "content": "token"}\n'
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+def build_app(kind):
+    app = Starlette(routes=[Route("/ping", ping), Route("/stream", stream)])
+    if kind == "legacy":
+        app.add_middleware(LegacyAuthMiddleware)
+    elif kind == "asgi":
+        app.add_middleware(AuthMiddleware, secret=SECRET)
+    return app
+
+
+async def call(app, path, token):
+    headers = [(b"host", b"bench")]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def bench_middleware(args):
+    token = jwt.encode({"user_id": "000000000000000000000000", "exp": int(time.time()) + 3600},
+                       SECRET, algorithm="HS256")
+    print(f"{'middleware':<10} {'path':<8} {'us/request':>11}")
+    for kind in ("none", "legacy", "asgi"):
+        app = build_app(kind)
+        for path in ("/ping", "/stream"):
+            for _ in range(50):
+                await call(app, path, token if kind != "none" else None)
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                status = await call(app, path, token if kind != "none" else None)
+            elapsed = time.perf_counter() - started
+            assert status == 200, status
+            print(f"{kind:<10} {path:<8} {elapsed / args.requests * 1e6:11.1f}")
+
+
+async def bench_admin_lookup(args):
+    # A blocking find_one as the old get_admin_user made it, vs the cached
+    # lookup in a thread, under concurrent admin requests.
+    def find_one(user_id):
+        time.sleep(args.lookup_ms / 1000)
+        return {"_id": user_id, "isAdmin": True}
+
+    async def blocking(user_id):
+        return find_one(user_id)
+
+    async def threaded(user_id):
+        return await asyncio.to_thread(find_one, user_id)
+
+    cache = UserCache(threaded)
+    lookups = {"blocking": blocking, "thread": threaded, "thread+cache": cache.get}
+    print(f"\n{args.concurrency} concurrent admin checks, {args.lookup_ms} ms per Mongo lookup")
+    for name, lookup in lookups.items():
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            await asyncio.gather(*[lookup("admin") for _ in range(args.concurrency)])
+        print(f"{name:<13} {(time.perf_counter() - started) / args.rounds * 1000:8.1f} ms per round")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request overhead of the auth middleware and admin lookup.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--lookup-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(bench_middleware(args))
+    asyncio.run(bench_admin_lookup(args))
+
+
+if __name__ == "__main__":
+    main()
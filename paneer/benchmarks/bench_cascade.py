@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import get_retriever, fetch_parent_candidates, run_cpu_bound, score_pairs, warm_up_models
+from cascade import cascade_rerank, CASCADE_RERANK_TOP_N, CASCADE_RERANK_STEP, CASCADE_RERANK_MARGIN
+
+QUERIES = [
+    "hostel fees NIT Trichy",
+    "Head of Department Computer Science NIT Trichy",
+    "Festember dates",
+    "Opal hostel location",
+    "attendance requirement end semester exam",
+    "robotics club NIT Trichy",
+    "training and placement office contact",
+    "M.Tech admission process CCMT",
+    "library timings",
+    "Pragyan techno-managerial festival",
+]
+
+
+async def score(pairs):
+    return await run_cpu_bound(score_pairs, pairs)
+
+
+async def full_rerank(query, candidates):
+    # Previous behaviour: cross-encode every retrieved parent, keep the top 6.
+    docs = [doc for doc, _ in candidates]
+    scores = await score([[query, doc.page_content] for doc in docs])
+    ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
+    return [doc for doc, _ in ranked[:6]], len(docs)
+
+
+async def run(args):
+    retriever = get_retriever()
+    if not retriever:
+        print("Retriever unavailable (is Chroma / Postgres running?)")
+        return
+    await run_cpu_bound(warm_up_models)
+
+    queries = args.query or QUERIES
+    rows = []
+    for query in queries:
+        candidates = await fetch_parent_candidates(retriever, query)
+        if not candidates:
+            print(f"no results: {query}")
+            continue
+
+        full_times, cascade_times = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            baseline, full_pairs = await full_rerank(query, candidates)
+            full_times.append(time.perf_counter() - started)
+
+            scored = []
+
+            async def counting_score(pairs):
+                scored.append(len(pairs))
+                return await score(pairs)
+
+            started = time.perf_counter()
+            ranked = await cascade_rerank(query, candidates, counting_score, top_n=args.top_n,
+                                          step=args.step, margin=args.margin)
+            cascade_times.append(time.perf_counter() - started)
+
+        cascade_docs = [doc for doc, _ in ranked]
+        overlap = len({d.id for d in baseline} & {d.id for d in cascade_docs}) / max(len(baseline), 1)
+        same_order = [d.id for d in baseline] == [d.id for d in cascade_docs]
+        rows.append((query, len(candidates), full_pairs, sum(scored) // args.repeat,
+                     min(full_times), min(cascade_times), overlap, same_order))
+
+    print(f"\ntop_n={args.top_n} step={args.step} margin={args.margin}")
+    print(f"{'query':<42} {'parents':>7} {'pairs':>11} {'full ms':>8} {'cascade ms':>10} {'top6':>5} {'order':>5}")
+    for query, parents, full_pairs, cascade_pairs, full_t, cascade_t, overlap, same_order in rows:
+        print(f"{query[:42]:<42} {parents:>7} {full_pairs:>4} -> {cascade_pairs:<4} "
+              f"{full_t * 1000:8.1f} {cascade_t * 1000:10.1f} {overlap:5.2f} {'yes' if same_order else 'no':>5}")
+    if rows:
+        n = len(rows)
+        print(f"\nmean full {sum(r[4] for r in rows) / n * 1000:.1f} ms, "
+              f"cascade {sum(r[5] for r in rows) / n * 1000:.1f} ms, "
+              f"top-6 agreement {sum(r[6] for r in rows) / n:.3f}, "
+              f"same order {sum(r[7] for r in rows)}/{n}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade reranking vs cross-encoding every retrieved parent.")
+    parser.add_argument("--query", action="append", help="Query to run (repeatable); defaults to a built-in set")
+    parser.add_argument("--top-n", type=int, default=CASCADE_RERANK_TOP_N)
+    parser.add_argument("--step", type=int, default=CASCADE_RERANK_STEP)
+    parser.add_argument("--margin", type=float, default=CASCADE_RERANK_MARGIN)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import (
+    get_retriever, get_embeddings, fetch_parent_candidates, aembed_query,
+    run_cpu_bound, score_pairs, warm_up_models, format_docs,
+)
+from cascade import cascade_rerank
+from compressor import compress_docs, CONTEXT_TOKEN_BUDGET
+from session_store import estimate_tokens
+
+QUERIES = [
+    "hostel fees NIT Trichy",
+    "Head of Department Computer Science NIT Trichy",
+    "Festember dates",
+    "attendance requirement end semester exam",
+    "training and placement office contact",
+    "M.Tech admission process CCMT",
+]
+
+
+async def score(pairs):
+    return await run_cpu_bound(score_pairs, pairs)
+
+
+async def run(args):
+    retriever = get_retriever()
+    if not retriever:
+        print("Retriever unavailable (is Chroma / Postgres running?)")
+        return
+    await run_cpu_bound(warm_up_models)
+    embed_documents = get_embeddings().embed_documents
+
+    print(f"budget={args.budget} tokens per search result")
+    print(f"{'query':<42} {'full tok':>8} {'compressed':>10} {'saved':>6} {'+ms':>7} {'sources kept':>12}")
+    totals = [0, 0, 0.0]
+    for query in args.query or QUERIES:
+        query_vector = await aembed_query(query)
+        candidates = await fetch_parent_candidates(retriever, query, query_vector)
+        if not candidates:
+            print(f"no results: {query}")
+            continue
+        docs = [doc for doc, _ in await cascade_rerank(query, candidates, score)]
+
+        full = format_docs(docs)
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            compressed = await run_cpu_bound(compress_docs, query_vector, docs, embed_documents, args.budget)
+            times.append(time.perf_counter() - started)
+
+        full_tokens, compressed_tokens = estimate_tokens(full), estimate_tokens(compressed)
+        sources = sum(1 for doc in docs if doc.metadata.get("source_url", "Unknown Source") in compressed)
+        totals[0] += full_tokens
+        totals[1] += compressed_tokens
+        totals[2] += min(times)
+        print(f"{query[:42]:<42} {full_tokens:8} {compressed_tokens:10} "
+              f"{1 - compressed_tokens / full_tokens:6.0%} {min(times) * 1000:7.1f} {sources:>6}/{len(docs)}")
+        if args.show:
+            print(compressed, "\n")
+
+    if totals[0]:
+        print(f"\nTool output tokens: {totals[0]} -> {totals[1]} ({1 - totals[1] / totals[0]:.0%} fewer), "
+              f"compression cost {totals[2] * 1000:.0f} ms in total.")
+        print("Every later agent step re-sends these tokens; for end-to-end latency run "
+              "benchmarks/chat_load.py against servers with CONTEXT_COMPRESSION_ENABLED=true / false.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens and latency of sentence-level context compression.")
+    parser.add_argument("--query", action="append", help="Query to run (repeatable); defaults to a built-in set")
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--show", action="store_true", help="Print the compressed tool output")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from starlette.responses import StreamingResponse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from frames import FrameWriter, write_frames
+
+THOUGHT = ("The user is asking about the hostel fee for first-year students, so I should search the fee "
+           "circular and check whether the mess advance is included. ")
+ANSWER = ("For the 2024-25 academic year, first-year B.Tech students pay a hostel admission fee, room rent "
+          "for each semester and a mess advance, as listed in the [hostel fee circular](https://www.nitt.edu). ")
+
+
+def token_frames(tokens):
+    # Groq streams roughly 4 characters per chunk; the first third is thinking.
+    frames = []
+    for i in range(tokens):
+        kind, text = ("thought_chunk", THOUGHT) if i < tokens // 3 else ("text_chunk", ANSWER)
+        start = (i * 4) % (len(text) - 4)
+        frames.append({"type": kind, "content": text[start:start + 4]})
+    frames.insert(tokens // 3, {"type": "status", "content": "Searching: hostel fee"})
+    return frames
+
+
+async def produce(frames, queue, finished, token_seconds):
+    for frame in frames:
+        if token_seconds:
+            await asyncio.sleep(token_seconds)
+        queue.put_nowait(frame)
+    queue.put_nowait(finished)
+
+
+async def legacy_body(frames, token_seconds):
+    # What stream_until_disconnect sent before frames.py: one json.dumps line per chunk.
+    queue = asyncio.Queue()
+    finished = object()
+    producer = asyncio.create_task(produce(frames, queue, finished, token_seconds))
+    while True:
+        frame = await queue.get()
+        if frame is finished:
+            break
+        yield json.dumps(frame) + "\n"
+    await producer
+
+
+async def coalesced_body(frames, token_seconds, writer):
+    queue = asyncio.Queue()
+    finished = object()
+    producer = asyncio.create_task(produce(frames, queue, finished, token_seconds))
+    async for data in write_frames(queue, finished, writer):
+        yield data
+    await producer
+
+
+async def send_answer(body):
+    writes = 0
+    size = 0
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal writes, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            writes += 1
+            size += len(message["body"])
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "method": "POST"}
+    await StreamingResponse(body, media_type="application/x-ndjson")(scope, receive, send)
+    return writes, size
+
+
+async def run(args):
+    frames = token_frames(args.tokens)
+    token_seconds = args.token_ms / 1000
+    print(f"{args.tokens} chunks per answer, {args.token_ms} ms apart, {args.answers} answers")
+    print(f"{'writer':<24} {'frames/answer':>13} {'KB/answer':>10} {'CPU ms/answer':>14} {'encode ms':>10}")
+    configs = [("json.dumps per chunk", None)]
+    for interval_ms in args.intervals:
+        configs.append((f"orjson, {interval_ms:g} ms/{args.max_bytes} B", interval_ms))
+
+    for name, interval_ms in configs:
+        writes = size = 0
+        encode = 0.0
+        cpu_started = time.process_time()
+        for _ in range(args.answers):
+            if interval_ms is None:
+                body = legacy_body(frames, token_seconds)
+            else:
+                writer = FrameWriter(interval=interval_ms / 1000, max_bytes=args.max_bytes)
+                body = coalesced_body(frames, token_seconds, writer)
+            w, s = await send_answer(body)
+            writes += w
+            size += s
+            if interval_ms is not None:
+                encode += writer.seconds
+        cpu = time.process_time() - cpu_started
+        encode_ms = f"{encode / args.answers * 1000:10.3f}" if interval_ms is not None else f"{'-':>10}"
+        print(f"{name:<24} {writes / args.answers:13.1f} {size / args.answers / 1024:10.1f} "
+              f"{cpu / args.answers * 1000:14.2f} {encode_ms}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames and CPU per streamed /chat answer, before and after coalescing.")
+    parser.add_argument("--tokens", type=int, default=1500)
+    parser.add_argument("--token-ms", type=float, default=2.0, help="delay between model chunks")
+    parser.add_argument("--answers", type=int, default=5)
+    parser.add_argument("--intervals", type=float, nargs="+", default=[0, 20, 40, 100],
+                        help="flush intervals (ms) to compare; 0 sends every chunk")
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
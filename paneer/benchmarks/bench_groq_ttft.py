@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("GROQ_KEY_POOL_SHARED", "false")
+
+import uvicorn
+from pydantic import BaseModel, Field
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from langchain_core.tools import Tool
+from langchain_groq import ChatGroq
+
+from utils import RotatingGroqChat
+
+
+def build_fake_groq(handshake_ms, tokens):
+    # Minimal OpenAI-compatible server. The first request on each new client
+    # connection sleeps handshake_ms to stand in for TCP + TLS setup, which a
+    # loopback HTTP server would otherwise make free.
+    seen = set()
+
+    async def connection_cost(request):
+        client = request.scope.get("client")
+        if client not in seen:
+            seen.add(client)
+            await asyncio.sleep(handshake_ms / 1000)
+
+    async def models(request):
+        await connection_cost(request)
+        return JSONResponse({"object": "list", "data": [{"id": "llama-3.1-8b-instant", "object": "model"}]})
+
+    async def completions(request):
+        await connection_cost(request)
+        body = await request.json()
+        model = body.get("model", "llama-3.1-8b-instant")
+
+        async def events():
+            for i in range(tokens):
+                chunk = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": f"tok{i} "} if i == 0 else {"content": f"tok{i} "},
+                        "finish_reason": None,
+                    }],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        headers = {
+            "x-ratelimit-limit-requests": "14400",
+            "x-ratelimit-remaining-requests": "14000",
+            "x-ratelimit-reset-requests": "2m59.56s",
+            "x-ratelimit-limit-tokens": "18000",
+            "x-ratelimit-remaining-tokens": "17000",
+            "x-ratelimit-reset-tokens": "7.66s",
+        }
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+    return Starlette(routes=[
+        Route("/openai/v1/models", models),
+        Route("/openai/v1/chat/completions", completions, methods=["POST"]),
+    ])
+
+
+def start_server(app):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def make_tools():
+    class SearchInput(BaseModel):
+        query: str = Field(description="The query to search for information about NIT Trichy.")
+
+    return [Tool(
+        name="search_nitt_data",
+        func=lambda query: "",
+        description="Searches for information about NIT Trichy.",
+        args_schema=SearchInput,
+    )]
+
+
+async def time_to_first_token(llm, messages):
+    started = time.perf_counter()
+    first = None
+    async for chunk in llm.astream(messages):
+        if first is None and chunk.content:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def run(args):
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        base_url, server = start_server(build_fake_groq(args.handshake_ms, args.tokens))
+        print(f"Fake Groq server on {base_url} (simulated handshake {args.handshake_ms} ms)")
+
+    api_keys = args.api_keys.split(",")
+    tools = make_tools()
+    messages = [("system", "You are a benchmark."), ("human", "Say something.")]
+
+    def per_call_llm(i):
+        # What RotatingGroqChat did before: new ChatGroq (and HTTP client)
+        # plus a fresh tool binding on every agent step.
+        api_key = api_keys[i % len(api_keys)]
+        llm = ChatGroq(api_key=api_key, model_name=args.model, temperature=0, max_retries=0, base_url=base_url)
+        return llm.bind_tools(tools)
+
+    pooled = RotatingGroqChat(api_keys=api_keys, model_name=args.model, base_url=base_url).bind_tools(tools)
+    await pooled.awarm_up()
+
+    results = {}
+    for name in ("per-call", "pooled"):
+        ttfts, totals = [], []
+        for i in range(args.requests):
+            llm = per_call_llm(i) if name == "per-call" else pooled
+            ttft, total = await time_to_first_token(llm, messages)
+            ttfts.append(ttft)
+            totals.append(total)
+        ttfts.sort()
+        results[name] = ttfts
+        print(f"{name:<9} TTFT p50 {ttfts[len(ttfts) // 2] * 1000:7.1f} ms  "
+              f"p95 {ttfts[int(len(ttfts) * 0.95) - 1] * 1000:7.1f} ms  "
+              f"mean total {sum(totals) / len(totals) * 1000:7.1f} ms")
+
+    p50_before = results["per-call"][len(results["per-call"]) // 2]
+    p50_after = results["pooled"][len(results["pooled"]) // 2]
+    print(f"TTFT p50 reduction: {(p50_before - p50_after) * 1000:.1f} ms ({p50_before / p50_after:.2f}x)")
+
+    if server:
+        server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-token: per-call ChatGroq vs pooled RotatingGroqChat.")
+    parser.add_argument("--base-url", help="Real Groq-compatible endpoint; a local fake server is used if omitted")
+    parser.add_argument("--api-keys", default="bench-key-1,bench-key-2", help="Comma-separated keys")
+    parser.add_argument("--model", default="llama-3.1-8b-instant")
+    parser.add_argument("--requests", type=int, default=50, help="Sequential agent steps per variant")
+    parser.add_argument("--handshake-ms", type=float, default=40.0, help="Simulated cost of a new connection on the fake server")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens streamed per fake response")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lexical_index import BM25Index, document_text, tokenize
+
+
+def postings_bytes(index):
+    return sum(a.itemsize * len(a) for a in index._post_docs) + sum(a.itemsize * len(a) for a in index._post_tfs)
+
+
+def load_documents(args):
+    if args.synthetic:
+        rng = random.Random(0)
+        vocab = [f"term{i}" for i in range(20000)]
+        names = [f"name{i}" for i in range(args.synthetic)]
+        docs = []
+        for i in range(args.synthetic):
+            body = " ".join(rng.choice(vocab) for _ in range(300))
+            docs.append((f"doc{i}", f"Dr. {names[i]} profile {body}"))
+        return docs, [f"Dr. {n} email" for n in rng.sample(names, min(200, len(names)))]
+
+    from app import get_retriever
+    retriever = get_retriever()
+    if not retriever:
+        sys.exit("Retriever unavailable (is Chroma / Postgres running?); try --synthetic 5000")
+    store = retriever.docstore
+    keys = list(store.yield_keys())
+    docs = []
+    queries = []
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        for key, doc in zip(batch, store.mget(batch)):
+            if doc is None:
+                continue
+            docs.append((key, document_text(doc)))
+            title = doc.metadata.get("title", "")
+            if title and len(queries) < 200:
+                queries.append(" ".join(tokenize(title)[:3]))
+    return docs, [q for q in queries if q]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build time, size and query latency of the in-memory BM25 index.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Index N generated documents instead of the docstore")
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    docs, queries = load_documents(args)
+    index = BM25Index()
+    started = time.perf_counter()
+    index.rebuild(docs)
+    build = time.perf_counter() - started
+    print(f"{len(index)} documents, {len(index._term_ids)} terms, "
+          f"postings {postings_bytes(index) / 1024 / 1024:.1f} MB, built in {build:.2f}s")
+
+    latencies = []
+    for query in queries * 5:
+        started = time.perf_counter()
+        index.search(query, args.k)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    if latencies:
+        print(f"{len(latencies)} queries: p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} ms")
+
+    key, text = docs[0]
+    started = time.perf_counter()
+    for i in range(100):
+        index.upsert([(key, text)])
+    print(f"upsert: {(time.perf_counter() - started) / 100 * 1000:.3f} ms per document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import kendalltau
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from model_backends import (
+    MODEL_BACKENDS, DEFAULT_EMBEDDING_MODEL, DEFAULT_RERANKER_MODEL,
+    create_embeddings, create_reranker,
+)
+
+QUERIES = [
+    "What are the hostel fees at NIT Trichy?",
+    "Who is the head of the computer science department?",
+    "How do I apply for a semester exchange programme?",
+    "When does the Festember cultural festival take place?",
+    "Where is the Opal hostel located on campus?",
+    "What is the attendance requirement to write end semester exams?",
+    "Which clubs are there for robotics and electronics?",
+    "How can I contact the training and placement office?",
+]
+
+PASSAGES = [
+    "The hostel fee for the academic year includes room rent, establishment charges and mess advance, payable at the start of each semester.",
+    "Dr. Uma is a professor in the Department of Computer Science and Engineering and currently serves as the Head of the Department.",
+    "Students can apply for a semester abroad through the Office of International Relations, which lists partner universities and deadlines.",
+    "Festember is the annual cultural festival of NIT Trichy, usually held in September and attended by students from across the country.",
+    "Opal is a hostel for women students, located near the main gate and the Octagon computer centre.",
+    "A minimum of 75 percent attendance in each course is required to be eligible for the end semester examination.",
+    "Spider R&D club and the Robotics and Machine Intelligence club work on embedded systems, drones and autonomous robots.",
+    "The Training and Placement office can be reached by email or at its office in the administrative building during working hours.",
+    "The library is open from 8 AM to midnight on weekdays and provides access to IEEE, Springer and ACM digital libraries.",
+    "Admissions to the M.Tech programmes are through GATE scores followed by the CCMT counselling process.",
+    "The institute has 17 hostels for boys and several hostels for girls, with a central mess management committee.",
+    "Pragyan is the international techno-managerial festival organised by the students of NIT Trichy every year.",
+]
+
+
+def timed(func, *args, repeat=20):
+    func(*args)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def bench_embeddings(args, backends):
+    print(f"\n=== Embeddings: {args.embedding_model} ===")
+    models = {b: create_embeddings(args.embedding_model, b) for b in backends}
+    docs = (PASSAGES * (args.batch // len(PASSAGES) + 1))[:args.batch]
+    baseline_q = np.array([models["torch"].embed_query(q) for q in QUERIES])
+    baseline_d = np.array(models["torch"].embed_documents(docs))
+
+    print(f"{'backend':<10} {'query p50':>10} {'batch p50':>10} {'mean cos':>9} {'min cos':>9}")
+    for backend, model in models.items():
+        q_ms = timed(model.embed_query, QUERIES[0], repeat=args.repeat)
+        d_ms = timed(model.embed_documents, docs, repeat=max(args.repeat // 4, 3))
+        vectors_q = np.array([model.embed_query(q) for q in QUERIES])
+        vectors_d = np.array(model.embed_documents(docs))
+        ours = np.concatenate([vectors_q, vectors_d])
+        base = np.concatenate([baseline_q, baseline_d])
+        cos = (ours * base).sum(axis=1) / (np.linalg.norm(ours, axis=1) * np.linalg.norm(base, axis=1))
+        print(f"{backend:<10} {q_ms:8.2f}ms {d_ms:8.1f}ms {cos.mean():9.5f} {cos.min():9.5f}")
+
+
+def bench_reranker(args, backends):
+    print(f"\n=== Reranker: {args.reranker_model} ({len(PASSAGES)} passages per query) ===")
+    models = {b: create_reranker(args.reranker_model, b) for b in backends}
+    pair_sets = [[[q, p] for p in PASSAGES] for q in QUERIES]
+    baseline = [np.asarray(models["torch"].predict(pairs)) for pairs in pair_sets]
+
+    print(f"{'backend':<10} {'rerank p50':>10} {'kendall':>8} {'top1':>6} {'top6':>6} {'max |d|':>8}")
+    for backend, model in models.items():
+        ms = timed(model.predict, pair_sets[0], repeat=args.repeat)
+        taus, top1, top6, max_diff = [], 0, 0.0, 0.0
+        for pairs, base in zip(pair_sets, baseline):
+            scores = np.asarray(model.predict(pairs))
+            taus.append(kendalltau(scores, base).statistic)
+            top1 += int(np.argmax(scores) == np.argmax(base))
+            top6 += len(set(np.argsort(-scores)[:6]) & set(np.argsort(-base)[:6])) / 6
+            max_diff = max(max_diff, float(np.abs(scores - base).max()))
+        n = len(pair_sets)
+        print(f"{backend:<10} {ms:8.1f}ms {np.mean(taus):8.4f} {top1 / n:6.2f} {top6 / n:6.2f} {max_diff:8.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and parity of ONNX / int8 backends against torch.")
+    parser.add_argument("--backends", default=",".join(MODEL_BACKENDS), help="Comma-separated; torch is always included")
+    parser.add_argument("--embedding-model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--reranker-model", default=DEFAULT_RERANKER_MODEL)
+    parser.add_argument("--batch", type=int, default=32, help="Documents per embed_documents call")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", choices=["embedding", "reranker"])
+    args = parser.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends.split(",") if b and b != "torch"]
+    if args.only in (None, "embedding"):
+        bench_embeddings(args, backends)
+    if args.only in (None, "reranker"):
+        bench_reranker(args, backends)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from batcher import MicroBatcher
+from model_backends import DEFAULT_RERANKER_MODEL, create_reranker
+
+PASSAGE = (
+    "The hostel fee for the academic year includes room rent, establishment charges and mess advance, "
+    "payable at the start of each semester. Students staying in the hostels must also pay a caution deposit "
+    "which is refunded at the end of the programme. "
+)
+
+
+def make_pairs(i, n, passage_words):
+    words = PASSAGE.split()
+    passage = " ".join((words * (passage_words // len(words) + 1))[:passage_words])
+    return [[f"hostel fees question {i}", f"{j} {passage}"] for j in range(n)]
+
+
+async def run_level(args, reranker, concurrency, batched):
+    executor = ThreadPoolExecutor(max_workers=args.cpu_workers)
+
+    async def runner(func, items):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, items))
+
+    def score(pairs):
+        return reranker.predict(pairs, batch_size=max(len(pairs), 1))
+
+    batcher = MicroBatcher(score, runner, args.max_batch, args.wait_ms, name="bench") if batched else None
+    latencies = []
+
+    async def caller(c):
+        for r in range(args.rounds):
+            pairs = make_pairs(c * args.rounds + r, args.pairs, args.passage_words)
+            started = time.perf_counter()
+            if batcher:
+                await batcher.submit(pairs)
+            else:
+                await runner(score, pairs)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[caller(c) for c in range(concurrency)])
+    wall = time.perf_counter() - started
+    executor.shutdown()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+    return len(latencies) / wall, p50, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerank throughput vs latency with and without micro-batching.")
+    parser.add_argument("--model", default=DEFAULT_RERANKER_MODEL)
+    parser.add_argument("--backend", default=None, help="torch, onnx or onnx-int8 (default: RERANKER_BACKEND)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrent searches")
+    parser.add_argument("--rounds", type=int, default=5, help="Reranks per concurrent caller")
+    parser.add_argument("--pairs", type=int, default=30, help="Pairs per rerank (one search)")
+    parser.add_argument("--passage-words", type=int, default=200)
+    parser.add_argument("--max-batch", type=int, default=128)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--cpu-workers", type=int, default=int(os.getenv("CPU_EXECUTOR_WORKERS", 2)))
+    args = parser.parse_args()
+
+    reranker = create_reranker(args.model, args.backend)
+    reranker.predict(make_pairs(0, args.pairs, args.passage_words))
+
+    print(f"{'conc':>4} | {'unbatched rps':>13} {'p50':>8} {'p95':>8} | {'batched rps':>11} {'p50':>8} {'p95':>8}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        plain = asyncio.run(run_level(args, reranker, concurrency, batched=False))
+        batched = asyncio.run(run_level(args, reranker, concurrency, batched=True))
+        print(f"{concurrency:>4} | {plain[0]:13.2f} {plain[1]:6.0f}ms {plain[2]:6.0f}ms | "
+              f"{batched[0]:11.2f} {batched[1]:6.0f}ms {batched[2]:6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from segmenter import TagSegmenter
+
+SAMPLE_ANSWER = (
+    "<thinking>The user wants the hostel fee for first-year B.Tech students. "
+    "I should search for the fee structure and check whether mess charges are included.</thinking>"
+    "<thinking>The search returned the 2024-25 fee circular. It lists the hostel admission fee, "
+    "room rent and the mess advance separately, so I will add them up and cite the circular.</thinking>"
+    "For the 2024-25 academic year, first-year B.Tech students pay the following hostel charges:\n\n"
+    "| Item | Amount (INR) |\n|---|---|\n| Hostel admission fee | 5,000 |\n| Room rent (per semester) | 12,500 |\n"
+    "| Mess advance | 24,000 |\n\nThese figures come from the "
+    "[hostel fee circular](https://www.nitt.edu/home/students/hostels/fees). "
+    "Note that a < b comparisons and stray angle brackets like <b>bold</b> are not tags. "
+    "Mess charges are adjusted at the end of each semester based on actual consumption."
+)
+
+
+def legacy_segments(chunks):
+    # The inline state machine chat_generator used before TagSegmenter.
+    out = []
+    buffer = ""
+    is_thinking = False
+    for content in chunks:
+        buffer += content
+        while True:
+            if is_thinking:
+                end_tag = "</thinking>"
+                if end_tag in buffer:
+                    thought, rest = buffer.split(end_tag, 1)
+                    out.append(("thought_chunk", thought))
+                    buffer = rest
+                    is_thinking = False
+                else:
+                    match_len = 0
+                    for i in range(1, len(end_tag)):
+                        if buffer.endswith(end_tag[:i]):
+                            match_len = i
+                    if match_len > 0:
+                        to_yield = buffer[:-match_len]
+                        buffer = buffer[-match_len:]
+                        if to_yield:
+                            out.append(("thought_chunk", to_yield))
+                    else:
+                        out.append(("thought_chunk", buffer))
+                        buffer = ""
+                    break
+            else:
+                start_tag = "<thinking>"
+                if start_tag in buffer:
+                    text, rest = buffer.split(start_tag, 1)
+                    if text:
+                        out.append(("text_chunk", text))
+                    buffer = rest
+                    is_thinking = True
+                else:
+                    match_len = 0
+                    for i in range(1, len(start_tag)):
+                        if buffer.endswith(start_tag[:i]):
+                            match_len = i
+                    if match_len > 0:
+                        to_yield = buffer[:-match_len]
+                        buffer = buffer[-match_len:]
+                        if to_yield:
+                            out.append(("text_chunk", to_yield))
+                    else:
+                        out.append(("text_chunk", buffer))
+                        buffer = ""
+                    break
+    if buffer:
+        out.append(("thought_chunk" if is_thinking else "text_chunk", buffer))
+    return out
+
+
+def segmenter_segments(chunks):
+    segmenter = TagSegmenter({"thinking": "thought_chunk"})
+    out = []
+    for content in chunks:
+        out.extend(segmenter.feed(content))
+    out.extend(segmenter.flush())
+    return out
+
+
+def merge(segments):
+    merged = []
+    for kind, text in segments:
+        if not text:
+            continue
+        if merged and merged[-1][0] == kind:
+            merged[-1] = (kind, merged[-1][1] + text)
+        else:
+            merged.append((kind, text))
+    return merged
+
+
+def tokenize(text, rng):
+    # Roughly the 1-6 character chunks Groq streams for llama-3.1.
+    chunks = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 6)
+        chunks.append(text[i:i + n])
+        i += n
+    return chunks
+
+
+def verify(streams):
+    # Chunk-boundary checks live in tests/test_segmenter.py; this only makes
+    # sure the two parsers being timed agree.
+    for chunks in streams:
+        if merge(legacy_segments(chunks)) != merge(segmenter_segments(chunks)):
+            raise AssertionError("TagSegmenter disagrees with the legacy state machine")
+    print(f"Verified {len(streams)} streams against the legacy parser.")
+
+
+def bench(name, fn, streams, repeat):
+    best = None
+    frames = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = 0
+        for chunks in streams:
+            frames += len(fn(chunks))
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    total_chunks = sum(len(c) for c in streams)
+    print(f"{name:<15} {best * 1000:8.2f} ms  {best / total_chunks * 1e6:6.2f} us/chunk  {frames} frames")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TagSegmenter against the legacy inline parser.")
+    parser.add_argument("--streams", help="JSONL file, one recorded stream (list of chunk strings) per line")
+    parser.add_argument("--synthetic", type=int, default=200, help="Synthetic streams to generate when --streams is not given")
+    parser.add_argument("--scale", type=int, default=4, help="Repeat the sample answer this many times per synthetic stream")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.streams:
+        with open(args.streams, "r", encoding="utf-8") as f:
+            streams = [json.loads(line) for line in f if line.strip()]
+    else:
+        streams = [tokenize(SAMPLE_ANSWER * args.scale, rng) for _ in range(args.synthetic)]
+
+    verify(streams[:20])
+
+    total_chunks = sum(len(c) for c in streams)
+    print(f"{len(streams)} streams, {total_chunks} chunks")
+    legacy = bench("legacy", legacy_segments, streams, args.repeat)
+    current = bench("TagSegmenter", segmenter_segments, streams, args.repeat)
+    print(f"Speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
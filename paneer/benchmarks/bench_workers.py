@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from chat_load import make_token, run_chat
+
+PANEER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def children_of(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def memory_mb(pid):
+    # RSS counts shared pages in every process; PSS splits them between the
+    # processes sharing them, so sum(PSS) is the real footprint.
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:"):
+                values[parts[0][:-1].lower()] = int(parts[1]) / 1024
+    return values
+
+
+def wait_until_ready(base_url, master, workers, timeout):
+    # Ready once every worker has answered /metrics; each reports its pid
+    # under startup.components.worker. New connections per request so the
+    # kernel can hand them to different workers.
+    deadline = time.monotonic() + timeout
+    seen = set()
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError(f"Server exited with status {master.returncode}")
+        try:
+            response = httpx.get(base_url + "/metrics", timeout=2)
+            seen.add(response.json()["startup"]["components"]["worker"]["pid"])
+        except (httpx.HTTPError, KeyError, ValueError):
+            time.sleep(0.5)
+            continue
+        if len(seen) >= workers:
+            return children_of(master.pid)
+        time.sleep(0.05)
+    raise RuntimeError("Server did not become ready in time")
+
+
+async def measure_rps(args, base_url):
+    token = make_token(args.user_id)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        async def one(i):
+            if args.chat:
+                *_, frames = await run_chat(client, base_url + "/chat", token, f"{args.message} ({i})")
+                if frames is None:
+                    raise RuntimeError("Chat rejected by admission control; raise CHAT_MAX_QUEUE / "
+                                       "CHAT_MAX_QUEUED_PER_USER for this benchmark")
+            else:
+                response = await client.get(base_url + args.path)
+                response.raise_for_status()
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(i):
+            async with semaphore:
+                await one(i)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[bounded(i) for i in range(args.requests)])
+        return args.requests / (time.perf_counter() - started)
+
+
+def run_one(args, workers):
+    base_url = f"http://127.0.0.1:{args.port}"
+    master = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port), "--log-level", "warning"],
+        cwd=PANEER_DIR,
+    )
+    try:
+        started = time.perf_counter()
+        pids = wait_until_ready(base_url, master, workers, args.startup_timeout)
+        ready = time.perf_counter() - started
+
+        master_mem = memory_mb(master.pid)
+        worker_mem = [memory_mb(pid) for pid in pids]
+        rps = asyncio.run(measure_rps(args, base_url))
+        after = [memory_mb(pid) for pid in pids if os.path.exists(f"/proc/{pid}")]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+    def avg(rows, key):
+        return sum(r[key] for r in rows) / len(rows) if rows else 0.0
+
+    total_pss = master_mem["pss"] + sum(m["pss"] for m in after)
+    print(f"{workers:>7} {ready:8.1f}s {master_mem['rss']:10.0f} {avg(worker_mem, 'rss'):10.0f} "
+          f"{avg(after, 'rss'):10.0f} {avg(after, 'shared_clean') + avg(after, 'shared_dirty'):10.0f} "
+          f"{total_pss:10.0f} {rps:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS per worker and throughput of serve.py for 1..N pre-forked workers.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--path", default="/metrics", help="GET path to load when --chat is not set")
+    parser.add_argument("--chat", action="store_true", help="Load /chat instead (needs Groq keys; numbered messages avoid the answer cache)")
+    parser.add_argument("--message", default="What are the hostel fees at NIT Trichy?")
+    parser.add_argument("--user-id", default="000000000000000000000000", help="user_id claim for the JWT")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print("All memory figures in MB; 'shared' is per worker, 'PSS' is master + all workers.")
+    print(f"{'workers':>7} {'ready':>9} {'master RSS':>10} {'RSS idle':>10} {'RSS load':>10} {'shared':>10} {'total PSS':>10} {'req/s':>8}")
+    for workers in range(1, args.max_workers + 1):
+        run_one(args, workers)
+
+
+if __name__ == "__main__":
+    main()
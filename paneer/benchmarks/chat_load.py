@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+import jwt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
+
+
+def make_token(user_id):
+    return jwt.encode({"user_id": user_id, "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256")
+
+
+async def run_chat(client, url, token, message):
+    started = time.perf_counter()
+    first_byte = None
+    frames = 0
+    async with client.stream(
+        "POST",
+        url,
+        json={"message": message, "session_id": str(uuid.uuid4())},
+        headers={"Authorization": f"Bearer {token}"},
+    ) as response:
+        if response.status_code == 503:
+            # Turned away by the server's admission control.
+            return started, time.perf_counter(), None, None
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            frames += 1
+    return started, time.perf_counter(), first_byte, frames
+
+
+async def run_load(args):
+    token = make_token(args.user_id)
+    # Chats are spread over --users user IDs (admission control queues per user).
+    tokens = [token] + [make_token(f"{i:024x}") for i in range(1, args.users)]
+    url = args.endpoint.rstrip("/") + "/chat"
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        print(f"Warm-up request against {url}...")
+        await run_chat(client, url, token, args.message)
+
+        sequential_total = 0.0
+        if args.sequential:
+            print(f"Running {args.concurrency} chats sequentially...")
+            t0 = time.perf_counter()
+            for _ in range(args.concurrency):
+                await run_chat(client, url, token, args.message)
+            sequential_total = time.perf_counter() - t0
+
+        print(f"Running {args.concurrency} chats concurrently...")
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*[
+            run_chat(client, url, tokens[i % len(tokens)], args.message) for i in range(args.concurrency)
+        ])
+        wall = time.perf_counter() - t0
+
+    rejected = sum(1 for *_, frames in results if frames is None)
+    results = [r for r in results if r[3] is not None]
+    if not results:
+        print(f"All {rejected} chats were rejected with 503.")
+        return
+    durations = sorted(end - start for start, end, _, _ in results)
+    ttfb = sorted(fb for _, _, fb, _ in results if fb is not None)
+    per_chat_sum = sum(durations)
+
+    print("\n--- Results ---")
+    print(f"Concurrent chats:        {len(results)}")
+    if rejected:
+        print(f"Rejected (503):          {rejected}")
+    print(f"Wall time:               {wall:.2f}s")
+    print(f"Sum of chat durations:   {per_chat_sum:.2f}s")
+    print(f"Median chat duration:    {durations[len(durations) // 2]:.2f}s")
+    print(f"Slowest chat:            {durations[-1]:.2f}s")
+    if ttfb:
+        print(f"Median time to 1st frame: {ttfb[len(ttfb) // 2]:.2f}s")
+    # ~1.0 means chats ran one after another, ~N means fully parallel
+    print(f"Overlap factor:          {per_chat_sum / wall:.2f}x (ideal {len(results)}x)")
+    if sequential_total:
+        print(f"Sequential wall time:    {sequential_total:.2f}s")
+        print(f"Speedup vs sequential:   {sequential_total / wall:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire concurrent /chat streams at a running paneer server.")
+    parser.add_argument("--endpoint", default="http://localhost:8000", help="Base URL of the paneer API")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of chats to run at once")
+    parser.add_argument("--message", default="What are the hostel fees at NIT Trichy?", help="Message to send")
+    parser.add_argument("--user-id", default="000000000000000000000000", help="user_id claim for the JWT")
+    parser.add_argument("--users", type=int, default=1, help="Number of distinct user IDs to spread the chats over")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sequential", action="store_true", help="Also run the same chats one by one for comparison")
+
+    args = parser.parse_args()
+    asyncio.run(run_load(args))
+
+
+if __name__ == "__main__":
+    main()
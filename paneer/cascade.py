@@ -0,0 +1,64 @@
+import os
+import hashlib
+from metrics import metrics
+
+CASCADE_RERANK_ENABLED = os.getenv("CASCADE_RERANK_ENABLED", "true").lower() == "true"
+# At most this many parents (in retrieval order) reach the CrossEncoder.
+CASCADE_RERANK_TOP_N = int(os.getenv("CASCADE_RERANK_TOP_N", 12))
+# Parents cross-encoded per round after the first `keep`.
+CASCADE_RERANK_STEP = int(os.getenv("CASCADE_RERANK_STEP", 3))
+# Stop once the k-th best CrossEncoder score beats the best score of the
+# latest round by this much (ms-marco logits, so independent of
+# RETRIEVER_AGGREGATION and of how candidates were fused).
+CASCADE_RERANK_MARGIN = float(os.getenv("CASCADE_RERANK_MARGIN", 1.0))
+
+def dedupe_by_content(scored_parents):
+    """Keeps the first of any parents with identical content (the same page
+    crawled under two URLs). Order is preserved."""
+    seen_content = set()
+    unique = []
+    for parent, score in scored_parents:
+        digest = hashlib.sha1(parent.page_content.encode("utf-8")).digest()
+        if digest in seen_content:
+            continue
+        seen_content.add(digest)
+        unique.append((parent, score))
+    return unique
+
+
+async def cascade_rerank(query, candidates, score_pairs, keep=6, top_n=CASCADE_RERANK_TOP_N,
+                         step=CASCADE_RERANK_STEP, margin=CASCADE_RERANK_MARGIN):
+    """Cross-encodes `candidates` ([(doc, retrieval_score)], in retrieval
+    order) in rounds and returns the `keep` docs with the best CrossEncoder
+    scores, best first.
+
+    The first round scores the top `keep` candidates; later rounds add `step`
+    more at a time, up to `top_n`. Candidates further down the retrieval
+    order score lower with the CrossEncoder too, so the best score of the
+    latest round stands in as an upper bound for the rest: once the k-th best
+    score so far beats it by `margin`, the top `keep` is settled and the
+    remaining candidates are not scored. `score_pairs` is an async callable
+    returning one score per pair.
+    """
+    pending = list(candidates[:top_n])
+    scored = []
+    stopped = False
+    size = keep
+    while pending:
+        chunk, pending = pending[:size], pending[size:]
+        size = step
+        scores = [float(s) for s in await score_pairs([[query, doc.page_content] for doc, _ in chunk])]
+        scored.extend(zip((doc for doc, _ in chunk), scores))
+        if pending and len(scored) > keep:
+            kth = sorted((s for _, s in scored), reverse=True)[keep - 1]
+            if kth - max(scores) >= margin:
+                stopped = True
+                break
+
+    metrics.observe("cascade_candidates", len(candidates))
+    metrics.observe("cascade_scored", len(scored))
+    if stopped:
+        metrics.incr("cascade_early_stops")
+
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:keep]
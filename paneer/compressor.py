@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import numpy as np
+from metrics import metrics
+from session_store import estimate_tokens
+
+CONTEXT_COMPRESSION_ENABLED = os.getenv("CONTEXT_COMPRESSION_ENABLED", "true").lower() == "true"
+# Token budget for the content of one search result (all of its documents).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 700))
+# Fragments shorter than this are glued to the previous span ("Dr.", "Ph:" ...).
+MIN_SPAN_CHARS = 40
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+
+
+def split_spans(text):
+    """Splits a parent document into sentences, keeping markdown tables (runs
+    of lines starting with '|') as single blocks."""
+    spans = []
+    table = []
+
+    def add(span):
+        span = " ".join(span.split())
+        if not span:
+            return
+        if spans and (len(span) < MIN_SPAN_CHARS or len(spans[-1]) < MIN_SPAN_CHARS) and not spans[-1].startswith("|"):
+            spans[-1] = f"{spans[-1]} {span}"
+        else:
+            spans.append(span)
+
+    for line in text.split("\n"):
+        if line.lstrip().startswith("|"):
+            table.append(line.strip())
+            continue
+        if table:
+            spans.append("\n".join(table))
+            table = []
+        for sentence in _SENTENCE_END.split(line):
+            add(sentence)
+    if table:
+        spans.append("\n".join(table))
+    return spans
+
+
+def clip_span(span, max_tokens):
+    """Cuts `span` to about `max_tokens`, at a row break for tables and a word
+    break otherwise."""
+    if estimate_tokens(span) <= max_tokens:
+        return span
+    limit = max(1, max_tokens * 4)
+    cut = span.rfind("\n" if span.startswith("|") else " ", 0, limit)
+    return span[:cut if cut > 0 else limit]
+
+
+def compress_docs(query_vector, docs, embed_documents, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Formats `docs` like format_docs, but with each document cut down to its
+    spans most similar to the query, within `token_budget` in total.
+
+    Every document (kept in rerank order) keeps its Source line and its single
+    best span, clipped to an equal share of the budget if it is too long; the
+    remaining budget goes to the best spans overall. Selected spans are shown
+    in document order, with "..." where text was dropped.
+    """
+    if not docs:
+        return ""
+    started = time.perf_counter()
+    doc_spans = [split_spans(doc.page_content) for doc in docs]
+    flat = [(d, i, span) for d, spans in enumerate(doc_spans) for i, span in enumerate(spans)]
+    sources = [doc.metadata.get("source_url", "Unknown Source") for doc in docs]
+
+    texts = [span for _, _, span in flat]
+    by_score = []
+    if flat:
+        vectors = np.asarray(embed_documents(texts), dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = vectors @ query / np.clip(norms, 1e-12, None)
+        by_score = sorted(range(len(flat)), key=lambda k: scores[k], reverse=True)
+    best_per_doc = {}
+    for k in by_score:
+        best_per_doc.setdefault(flat[k][0], k)
+
+    used = sum(estimate_tokens(f"Content: \nSource: {source}") for source in sources)
+    share = max(1, (token_budget - used) // len(docs))
+    selected = set()
+    clipped = set()
+    for k in best_per_doc.values():
+        texts[k] = clip_span(texts[k], share)
+        if texts[k] != flat[k][2]:
+            clipped.add(k)
+        selected.add(k)
+        used += estimate_tokens(texts[k])
+    for k in by_score:
+        if k in selected:
+            continue
+        cost = estimate_tokens(texts[k])
+        if used + cost > token_budget:
+            continue
+        selected.add(k)
+        used += cost
+
+    formatted_docs = []
+    k = 0
+    for d, spans in enumerate(doc_spans):
+        parts = []
+        previous = -1
+        for i in range(len(spans)):
+            if k + i in selected:
+                if i != previous + 1:
+                    parts.append("...")
+                parts.append(texts[k + i])
+                previous = i
+        if parts and (previous != len(spans) - 1 or k + previous in clipped):
+            parts.append("...")
+        k += len(spans)
+        formatted_docs.append(f"Content: {' '.join(parts)}\nSource: {sources[d]}")
+
+    before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    metrics.observe("context_tokens_before", before)
+    metrics.observe("context_tokens_after", used)
+    metrics.observe("context_compression_seconds", time.perf_counter() - started)
+    return "\n\n".join(formatted_docs)
@@ -0,0 +1,92 @@
+import os
+import time
+import asyncio
+import redis
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from redis.retry import Retry
+from pymongo import AsyncMongoClient
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+# How long a command waits for a free pooled connection before failing.
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+# Idle connections are PINGed before reuse once they've been idle this long.
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_RETRIES = 3
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 3000))
+
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+
+
+def _redis_options(socket_timeout, retry):
+    return dict(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=0,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        # A dropped connection is reopened and the command retried.
+        retry=retry,
+        retry_on_error=[RedisConnectionError, RedisTimeoutError],
+    )
+
+
+def create_async_redis(max_connections=REDIS_MAX_CONNECTIONS, socket_timeout=REDIS_SOCKET_TIMEOUT):
+    """redis.asyncio client on a bounded pool: past `max_connections`,
+    callers wait up to REDIS_POOL_TIMEOUT for a free connection instead of
+    opening more."""
+    retry = AsyncRetry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES)
+    pool = aioredis.BlockingConnectionPool(
+        max_connections=max_connections, timeout=REDIS_POOL_TIMEOUT, **_redis_options(socket_timeout, retry)
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def create_redis(max_connections=4, socket_timeout=REDIS_SOCKET_TIMEOUT):
+    """Blocking client for code that runs on its own thread (e.g. the lexical
+    index follower)."""
+    retry = Retry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES)
+    pool = redis.BlockingConnectionPool(
+        max_connections=max_connections, timeout=REDIS_POOL_TIMEOUT, **_redis_options(socket_timeout, retry)
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def create_mongo_client():
+    # The driver reconnects and re-selects a server on its own; these bound
+    # how long a request can wait for it.
+    return AsyncMongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_TIMEOUT_MS * 2,
+        waitQueueTimeoutMS=MONGO_TIMEOUT_MS,
+        retryReads=True,
+        retryWrites=True,
+    )
+
+
+async def check_health(checks):
+    """checks: {name: async callable}. Returns ({name: status}, all_ok)."""
+    async def probe(check):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), HEALTH_CHECK_TIMEOUT_SECONDS)
+            return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+        except Exception as e:
+            return {"ok": False, "error": str(e) or type(e).__name__}
+
+    results = await asyncio.gather(*[probe(check) for check in checks.values()])
+    status = dict(zip(checks, results))
+    return status, all(s["ok"] for s in results)
@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import orjson
+from metrics import metrics
+
+# text_chunk / thought_chunk frames are merged until the oldest pending chunk
+# is this old or this many bytes are pending; other frames go out at once.
+# STREAM_FLUSH_INTERVAL_MS=0 sends every chunk as its own frame.
+STREAM_FLUSH_INTERVAL_SECONDS = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", 40)) / 1000
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", 512))
+
+COALESCED_TYPES = ("text_chunk", "thought_chunk")
+
+
+def encode_frame(frame):
+    return orjson.dumps(frame) + b"\n"
+
+
+def merge_frames(frames):
+    """Joins runs of same-type chunks, e.g. to replay a cached answer."""
+    merged = []
+    for frame in frames:
+        kind = frame.get("type")
+        if kind in COALESCED_TYPES and merged and merged[-1].get("type") == kind:
+            merged[-1] = {"type": kind, "content": merged[-1]["content"] + frame["content"]}
+        else:
+            merged.append(frame)
+    return merged
+
+
+class FrameWriter:
+    """Turns frame dicts into NDJSON bytes, holding back chunks of text so a
+    streamed answer is written in a few dozen frames rather than one per
+    token. A chunk of a different type, or any other frame, flushes what is
+    pending first, so frame order is preserved."""
+
+    def __init__(self, interval=STREAM_FLUSH_INTERVAL_SECONDS, max_bytes=STREAM_FLUSH_BYTES):
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._kind = None
+        self._parts = []
+        self._size = 0
+        self._since = 0.0
+        self.chunks = 0
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def due(self):
+        """Seconds until pending chunks must be flushed; None if there are none."""
+        if not self._parts:
+            return None
+        return max(0.0, self._since + self.interval - time.monotonic())
+
+    def write(self, frame):
+        started = time.perf_counter()
+        kind = frame.get("type")
+        if kind in COALESCED_TYPES:
+            self.chunks += 1
+            out = self._take() if self._parts and kind != self._kind else b""
+            if not self._parts:
+                self._kind = kind
+                self._since = time.monotonic()
+            text = frame["content"]
+            self._parts.append(text)
+            self._size += len(text.encode())
+            if self._size >= self.max_bytes or time.monotonic() - self._since >= self.interval:
+                out += self._take()
+        else:
+            out = self._take() + self._encode(frame)
+        self.seconds += time.perf_counter() - started
+        return out
+
+    def flush(self):
+        started = time.perf_counter()
+        out = self._take()
+        self.seconds += time.perf_counter() - started
+        return out
+
+    def _take(self):
+        if not self._parts:
+            return b""
+        content = self._parts[0] if len(self._parts) == 1 else "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return self._encode({"type": self._kind, "content": content})
+
+    def _encode(self, frame):
+        data = encode_frame(frame)
+        self.frames += 1
+        self.bytes += len(data)
+        return data
+
+    def record(self):
+        metrics.observe("stream_chunks_per_answer", self.chunks)
+        metrics.observe("stream_frames_per_answer", self.frames)
+        metrics.observe("stream_bytes_per_answer", self.bytes)
+        metrics.observe("stream_encode_seconds", self.seconds)
+
+
+async def write_frames(queue, finished, writer=None):
+    """Yields NDJSON bytes for the frame dicts put on `queue` until `finished`
+    is put. Held-back chunks are flushed when their interval runs out even if
+    no further frame arrives: a timer puts a tick on the queue, one per
+    flushed frame rather than a wait_for per chunk."""
+    writer = writer or FrameWriter()
+    loop = asyncio.get_running_loop()
+    tick = object()
+    timer = None
+    try:
+        while True:
+            frame = await queue.get()
+            if frame is finished:
+                break
+            if frame is tick:
+                timer = None
+                due = writer.due()
+                if due:
+                    timer = loop.call_later(due, queue.put_nowait, tick)
+                elif due is not None:
+                    yield writer.flush()
+                continue
+            data = writer.write(frame)
+            if data:
+                yield data
+            if timer is None and writer.due() is not None:
+                timer = loop.call_later(writer.due(), queue.put_nowait, tick)
+        data = writer.flush()
+        if data:
+            yield data
+    finally:
+        if timer is not None:
+            timer.cancel()
+        writer.record()
@@ -0,0 +1,105 @@
+DOC_VERSION_PREFIX = "rag:doc_version:"
+WIPE_EPOCH_KEY = "rag:wipe_epoch"
+INDEX_GENERATION_KEY = "rag:index_generation"
+DOC_CHANGES_STREAM = "rag:doc_changes"
+DOC_CHANGES_MAXLEN = 10000
+
+# Version counters for indexed documents, shared through Redis so that the
+# API, the worker and any other process writing to Chroma/Postgres agree on
+# when something derived from a document (e.g. a cached answer) is stale.
+# The index generation moves on every write of any kind, so it can key
+# caches of whole search results; per-document versions and the wipe epoch
+# let caches that know their source documents survive unrelated writes.
+# Every change is also appended to a capped stream so in-memory indexes
+# (lexical_index) can apply just the documents that changed.
+
+
+def _publish_change(pipe, op, doc_ids=None):
+    pipe.xadd(DOC_CHANGES_STREAM, {"op": op, "ids": ",".join(doc_ids or [])},
+              maxlen=DOC_CHANGES_MAXLEN, approximate=True)
+
+
+def _run(redis_client, build, failure):
+    if redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        build(pipe)
+        pipe.execute()
+    except Exception as e:
+        print(f"Warning: {failure}: {e}")
+
+
+async def _arun(redis_client, build, failure):
+    # Same as _run, for redis.asyncio clients.
+    if redis_client is None:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        build(pipe)
+        await pipe.execute()
+    except Exception as e:
+        print(f"Warning: {failure}: {e}")
+
+
+def _index_write(doc_ids):
+    # doc_ids: the parent IDs written, when the caller knows them.
+    def build(pipe):
+        pipe.incr(INDEX_GENERATION_KEY)
+        _publish_change(pipe, "write", [d for d in doc_ids or [] if d])
+    return build
+
+
+def _document_changes(doc_ids):
+    def build(pipe):
+        for doc_id in doc_ids:
+            pipe.incr(DOC_VERSION_PREFIX + doc_id)
+        pipe.incr(INDEX_GENERATION_KEY)
+        _publish_change(pipe, "change", doc_ids)
+    return build
+
+
+def _index_wipe(pipe):
+    pipe.incr(WIPE_EPOCH_KEY)
+    pipe.incr(INDEX_GENERATION_KEY)
+    _publish_change(pipe, "wipe")
+
+
+def record_index_write(redis_client, doc_ids=None):
+    _run(redis_client, _index_write(doc_ids), "failed to bump index generation")
+
+
+async def arecord_index_write(redis_client, doc_ids=None):
+    await _arun(redis_client, _index_write(doc_ids), "failed to bump index generation")
+
+
+def record_document_changes(redis_client, doc_ids):
+    doc_ids = [d for d in doc_ids if d]
+    if doc_ids:
+        _run(redis_client, _document_changes(doc_ids), f"failed to record document changes for {doc_ids}")
+
+
+async def arecord_document_changes(redis_client, doc_ids):
+    doc_ids = [d for d in doc_ids if d]
+    if doc_ids:
+        await _arun(redis_client, _document_changes(doc_ids), f"failed to record document changes for {doc_ids}")
+
+
+def record_index_wipe(redis_client):
+    _run(redis_client, _index_wipe, "failed to record index wipe")
+
+
+async def arecord_index_wipe(redis_client):
+    await _arun(redis_client, _index_wipe, "failed to record index wipe")
+
+
+async def aget_document_versions(redis_client, doc_ids):
+    """Returns ({doc_id: version}, wipe_epoch) in one round trip."""
+    doc_ids = list(doc_ids)
+    values = await redis_client.mget([DOC_VERSION_PREFIX + d for d in doc_ids] + [WIPE_EPOCH_KEY])
+    versions = {doc_id: int(v or 0) for doc_id, v in zip(doc_ids, values)}
+    return versions, int(values[-1] or 0)
+
+
+async def aget_index_generation(redis_client):
+    return int(await redis_client.get(INDEX_GENERATION_KEY) or 0)
@@ -0,0 +1,404 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import httpx
+
+KEY_POOL_MAX_WAIT_SECONDS = float(os.getenv("GROQ_KEY_MAX_WAIT_SECONDS", 30))
+KEY_POOL_DEFAULT_COOLDOWN_SECONDS = float(os.getenv("GROQ_KEY_DEFAULT_COOLDOWN_SECONDS", 20))
+KEY_POOL_REDIS_PREFIX = "groq:keys:"
+GROQ_HTTP_MAX_CONNECTIONS = int(os.getenv("GROQ_HTTP_MAX_CONNECTIONS", 20))
+GROQ_HTTP_KEEPALIVE_SECONDS = float(os.getenv("GROQ_HTTP_KEEPALIVE_SECONDS", 120))
+# Shared state is only useful while it is fresh; let it expire if every
+# process using the pool goes away.
+KEY_POOL_STATE_TTL_SECONDS = 600
+
+_RESERVE_SCRIPT = (
+    "if redis.call('HEXISTS', KEYS[1], 'remaining_requests') == 1 then "
+    "return redis.call('HINCRBYFLOAT', KEYS[1], 'remaining_requests', -1) end "
+    "return nil"
+)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value):
+    """Parses Groq's reset headers ("2m59.56s", "7.66s", "120ms") or a plain
+    number of seconds into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+def key_fingerprint(api_key):
+    # Only a hash of the key ever leaves the process.
+    return hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class KeyPoolExhausted(Exception):
+    pass
+
+
+class GroqKeyPool:
+    """Schedules Groq API keys by remaining rate-limit headroom.
+
+    Every response from Groq carries x-ratelimit-* headers; the per-key HTTP
+    clients handed out by http_clients() feed them back here. acquire()
+    returns the key with the most remaining request/token budget, skipping
+    keys in a 429 cooldown, and blocks (up to `max_wait`) when every key is
+    exhausted rather than failing straight away. With a Redis client the
+    state is shared, so the API, the worker and the crawler see each other's
+    usage instead of each rediscovering an exhausted key. The async paths
+    (aacquire, the AsyncClient response hook) use `async_redis_client`, a
+    redis.asyncio client, so they never block the event loop.
+    """
+
+    def __init__(self, api_keys, redis_client=None, async_redis_client=None, max_wait=KEY_POOL_MAX_WAIT_SECONDS):
+        self.api_keys = [k.strip() for k in api_keys if k and k.strip()]
+        self.redis = redis_client
+        self.aredis = async_redis_client
+        self.max_wait = max_wait
+        self._ids = {k: key_fingerprint(k) for k in self.api_keys}
+        self._local = {k: {} for k in self.api_keys}
+        self._lock = threading.Lock()
+        self._http_clients = {}
+
+    def __len__(self):
+        return len(self.api_keys)
+
+    def _redis_key(self, api_key):
+        return KEY_POOL_REDIS_PREFIX + self._ids[api_key]
+
+    def _states_pipeline(self, client):
+        pipe = client.pipeline(transaction=False)
+        for api_key in self.api_keys:
+            pipe.hgetall(self._redis_key(api_key))
+        return pipe
+
+    def _parse_states(self, results):
+        states = {}
+        for api_key, raw in zip(self.api_keys, results):
+            states[api_key] = {
+                (k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()
+            }
+        return states
+
+    def _local_states(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self._local.items()}
+
+    def _load_states(self):
+        if self.redis is not None:
+            try:
+                return self._parse_states(self._states_pipeline(self.redis).execute())
+            except Exception as e:
+                logging.warning(f"Key pool: Redis state unavailable, using local state: {e}")
+        return self._local_states()
+
+    async def _aload_states(self):
+        if self.aredis is not None:
+            try:
+                return self._parse_states(await self._states_pipeline(self.aredis).execute())
+            except Exception as e:
+                logging.warning(f"Key pool: Redis state unavailable, using local state: {e}")
+        return self._local_states()
+
+    def _update_pipeline(self, client, api_key, fields):
+        with self._lock:
+            self._local[api_key].update(fields)
+        if client is None:
+            return None
+        key = self._redis_key(api_key)
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, KEY_POOL_STATE_TTL_SECONDS)
+        return pipe
+
+    def _update(self, api_key, fields):
+        try:
+            pipe = self._update_pipeline(self.redis, api_key, fields)
+            if pipe is not None:
+                pipe.execute()
+        except Exception as e:
+            logging.warning(f"Key pool: failed to share state: {e}")
+
+    async def _aupdate(self, api_key, fields):
+        try:
+            pipe = self._update_pipeline(self.aredis, api_key, fields)
+            if pipe is not None:
+                await pipe.execute()
+        except Exception as e:
+            logging.warning(f"Key pool: failed to share state: {e}")
+
+    def _reserve_local(self, api_key):
+        # Count the request against the key's remaining budget right away, so
+        # concurrent callers spread out instead of all picking the same key
+        # before its next response updates the headers.
+        with self._lock:
+            state = self._local[api_key]
+            if "remaining_requests" in state:
+                state["remaining_requests"] -= 1
+
+    def _reserve(self, api_key):
+        self._reserve_local(api_key)
+        if self.redis is None:
+            return
+        try:
+            self.redis.eval(_RESERVE_SCRIPT, 1, self._redis_key(api_key))
+        except Exception as e:
+            logging.warning(f"Key pool: failed to share reservation: {e}")
+
+    async def _areserve(self, api_key):
+        self._reserve_local(api_key)
+        if self.aredis is None:
+            return
+        try:
+            await self.aredis.eval(_RESERVE_SCRIPT, 1, self._redis_key(api_key))
+        except Exception as e:
+            logging.warning(f"Key pool: failed to share reservation: {e}")
+
+    @staticmethod
+    def _headroom(state, now):
+        """Returns (score, available_at). score is None while the key is
+        unusable; available_at is when it is expected to be usable again."""
+        cooldown_until = state.get("cooldown_until", 0)
+        if cooldown_until > now:
+            return None, cooldown_until
+
+        fractions = []
+        for budget, limit, reset_at in (
+            ("remaining_requests", "limit_requests", "requests_reset_at"),
+            ("remaining_tokens", "limit_tokens", "tokens_reset_at"),
+        ):
+            remaining = state.get(budget)
+            reset = state.get(reset_at, 0)
+            if remaining is None or reset <= now:
+                # Unknown, or the window has rolled over since we last heard.
+                fractions.append(1.0)
+                continue
+            if remaining <= 0:
+                return None, reset
+            cap = state.get(limit) or remaining
+            fractions.append(min(remaining / cap, 1.0))
+        return min(fractions), now
+
+    def _choose(self, states):
+        """(api_key, 0) for the key with the most headroom, or (None, seconds
+        until one is expected to free up)."""
+        now = time.time()
+        best_score = None
+        best_keys = []
+        next_available = None
+        for api_key in self.api_keys:
+            score, available_at = self._headroom(states.get(api_key, {}), now)
+            if score is None:
+                if next_available is None or available_at < next_available:
+                    next_available = available_at
+                continue
+            if best_score is None or score > best_score + 1e-9:
+                best_score = score
+                best_keys = [api_key]
+            elif abs(score - best_score) <= 1e-9:
+                best_keys.append(api_key)
+
+        if best_keys:
+            return random.choice(best_keys), 0.0
+        return None, max((next_available or now + 1.0) - now, 0.05)
+
+    def _pick(self):
+        api_key, wait = self._choose(self._load_states())
+        if api_key:
+            self._reserve(api_key)
+        return api_key, wait
+
+    async def _apick(self):
+        api_key, wait = self._choose(await self._aload_states())
+        if api_key:
+            await self._areserve(api_key)
+        return api_key, wait
+
+    def acquire(self, max_wait=None):
+        if not self.api_keys:
+            raise ValueError("No Groq API keys provided.")
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            api_key, wait = self._pick()
+            if api_key:
+                return api_key
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise KeyPoolExhausted("ALL API keys are currently rate-limited or exhausted.")
+            time.sleep(min(wait, remaining, 1.0))
+
+    async def aacquire(self, max_wait=None):
+        if not self.api_keys:
+            raise ValueError("No Groq API keys provided.")
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            api_key, wait = await self._apick()
+            if api_key:
+                return api_key
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise KeyPoolExhausted("ALL API keys are currently rate-limited or exhausted.")
+            await asyncio.sleep(min(wait, remaining, 1.0))
+
+    def _header_fields(self, status_code, headers):
+        now = time.time()
+        fields = {}
+        for header, field in (
+            ("x-ratelimit-limit-requests", "limit_requests"),
+            ("x-ratelimit-limit-tokens", "limit_tokens"),
+            ("x-ratelimit-remaining-requests", "remaining_requests"),
+            ("x-ratelimit-remaining-tokens", "remaining_tokens"),
+        ):
+            value = headers.get(header)
+            if value is not None:
+                try:
+                    fields[field] = float(value)
+                except ValueError:
+                    pass
+        for header, field in (
+            ("x-ratelimit-reset-requests", "requests_reset_at"),
+            ("x-ratelimit-reset-tokens", "tokens_reset_at"),
+        ):
+            seconds = parse_duration(headers.get(header))
+            if seconds is not None:
+                fields[field] = now + seconds
+
+        if status_code == 429:
+            retry_after = parse_duration(headers.get("retry-after"))
+            fields["cooldown_until"] = now + (retry_after or KEY_POOL_DEFAULT_COOLDOWN_SECONDS)
+        return fields
+
+    def record_headers(self, api_key, status_code, headers):
+        fields = self._header_fields(status_code, headers)
+        if fields:
+            self._update(api_key, fields)
+
+    async def arecord_headers(self, api_key, status_code, headers):
+        fields = self._header_fields(status_code, headers)
+        if fields:
+            await self._aupdate(api_key, fields)
+
+    def _cooldown_fields(self, api_key, retry_after):
+        until = time.time() + (retry_after or KEY_POOL_DEFAULT_COOLDOWN_SECONDS)
+        with self._lock:
+            current = self._local[api_key].get("cooldown_until", 0)
+        return {"cooldown_until": max(until, current)}
+
+    def record_rate_limited(self, api_key, retry_after=None):
+        self._update(api_key, self._cooldown_fields(api_key, retry_after))
+
+    async def arecord_rate_limited(self, api_key, retry_after=None):
+        await self._aupdate(api_key, self._cooldown_fields(api_key, retry_after))
+
+    def http_clients(self, api_key):
+        """(httpx.Client, httpx.AsyncClient) for `api_key` that report rate
+        limit headers of every response back to the pool."""
+        with self._lock:
+            clients = self._http_clients.get(api_key)
+            if clients:
+                return clients
+
+            def on_response(response):
+                self.record_headers(api_key, response.status_code, response.headers)
+
+            async def on_async_response(response):
+                await self.arecord_headers(api_key, response.status_code, response.headers)
+
+            # Long-lived and shared by every ChatGroq built for this key, so
+            # agent steps reuse warm keep-alive connections.
+            limits = httpx.Limits(
+                max_connections=GROQ_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=GROQ_HTTP_KEEPALIVE_SECONDS,
+            )
+            timeout = httpx.Timeout(60.0, connect=10.0)
+            clients = (
+                httpx.Client(limits=limits, timeout=timeout, event_hooks={"response": [on_response]}),
+                httpx.AsyncClient(limits=limits, timeout=timeout, event_hooks={"response": [on_async_response]}),
+            )
+            self._http_clients[api_key] = clients
+            return clients
+
+
+def is_rate_limit_error(error):
+    error_msg = str(error).lower()
+    return "429" in error_msg or "rate_limit" in error_msg or "too many requests" in error_msg
+
+
+def retry_after_from_error(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return parse_duration(response.headers.get("retry-after"))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _shared_redis_client():
+    try:
+        import redis
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+        client.ping()
+        return client
+    except Exception as e:
+        logging.warning(f"Key pool: Redis unavailable, key state will be per-process: {e}")
+        return None
+
+
+def _shared_async_redis_client():
+    from connections import create_async_redis
+    return create_async_redis(max_connections=GROQ_HTTP_MAX_CONNECTIONS, socket_timeout=0.5)
+
+
+def _reset_after_fork():
+    # Pools hold a Redis connection and httpx clients; a forked child must
+    # open its own rather than share the parent's sockets.
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_key_pool(api_keys):
+    """Returns the process-wide pool for this set of keys, so every Groq
+    caller in a process schedules against the same state."""
+    keys = tuple(k.strip() for k in api_keys if k and k.strip())
+    with _pools_lock:
+        pool = _pools.get(keys)
+        if pool is None:
+            use_redis = os.getenv("GROQ_KEY_POOL_SHARED", "true").lower() == "true"
+            redis_client = _shared_redis_client() if use_redis else None
+            pool = GroqKeyPool(
+                keys,
+                redis_client=redis_client,
+                # Only worth having if Redis answered the sync client's ping.
+                async_redis_client=_shared_async_redis_client() if redis_client is not None else None,
+            )
+            _pools[keys] = pool
+        return pool
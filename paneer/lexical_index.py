@@ -0,0 +1,305 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from array import array
+from collections import Counter
+import numpy as np
+from index_versions import DOC_CHANGES_STREAM
+from metrics import metrics
+
+LEXICAL_SEARCH_ENABLED = os.getenv("LEXICAL_SEARCH_ENABLED", "true").lower() == "true"
+LEXICAL_SEARCH_K = int(os.getenv("LEXICAL_SEARCH_K", 20))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rebuild the postings once this share of indexed documents are tombstones.
+COMPACT_DEAD_RATIO = 0.25
+LOAD_BATCH_SIZE = 500
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what who whom which when where how i me my you your he she they we our about".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def document_text(doc):
+    # Titles carry most of the names people search for.
+    return f"{doc.metadata.get('title', '')} {doc.page_content}"
+
+
+class BM25Index:
+    """BM25 over parent documents with array-backed postings.
+
+    Each term maps to a pair of typed arrays (document numbers, term
+    frequencies); documents only ever get new numbers, so appending keeps the
+    postings sorted and an update is a tombstone plus an append. Tombstoned
+    entries are skipped at query time and dropped when the index compacts.
+    Scoring runs over numpy views of the arrays.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._term_ids = {}
+        self._post_docs = []
+        self._post_tfs = []
+        self._df = array("I")
+        self._doc_keys = []
+        self._doc_numbers = {}
+        self._doc_lengths = array("I")
+        self._doc_terms = []
+        self._live = array("B")
+        self._live_count = 0
+        self._live_length = 0
+
+    def __len__(self):
+        return self._live_count
+
+    def _add(self, key, text):
+        counts = Counter(tokenize(text))
+        number = len(self._doc_keys)
+        self._doc_keys.append(key)
+        self._doc_numbers[key] = number
+        length = sum(counts.values())
+        self._doc_lengths.append(length)
+        self._live.append(1)
+        self._live_count += 1
+        self._live_length += length
+
+        term_ids = array("I")
+        for token, tf in counts.items():
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                term_id = self._term_ids[token] = len(self._post_docs)
+                self._post_docs.append(array("I"))
+                self._post_tfs.append(array("H"))
+                self._df.append(0)
+            self._post_docs[term_id].append(number)
+            self._post_tfs[term_id].append(min(tf, 65535))
+            self._df[term_id] += 1
+            term_ids.append(term_id)
+        self._doc_terms.append(term_ids)
+
+    def _remove(self, key):
+        number = self._doc_numbers.pop(key, None)
+        if number is None:
+            return
+        self._live[number] = 0
+        self._live_count -= 1
+        self._live_length -= self._doc_lengths[number]
+        for term_id in self._doc_terms[number]:
+            self._df[term_id] -= 1
+        self._doc_terms[number] = array("I")
+
+    def upsert(self, documents):
+        """documents: iterable of (key, text)."""
+        with self._lock:
+            for key, text in documents:
+                self._remove(key)
+                self._add(key, text)
+            self._maybe_compact()
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+            self._maybe_compact()
+
+    def keys(self):
+        with self._lock:
+            return set(self._doc_numbers)
+
+    def _maybe_compact(self):
+        dead = len(self._doc_keys) - self._live_count
+        if dead and dead >= COMPACT_DEAD_RATIO * len(self._doc_keys):
+            self._compact()
+
+    def _compact(self):
+        live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(live, dtype=np.int64) - 1
+        for term_id in range(len(self._post_docs)):
+            docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+            keep = live[docs]
+            new_docs = array("I", renumber[docs[keep]].astype(np.uint32).tobytes())
+            new_tfs = array("H", np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)[keep].tobytes())
+            del docs
+            self._post_docs[term_id] = new_docs
+            self._post_tfs[term_id] = new_tfs
+
+        keep_numbers = np.flatnonzero(live)
+        self._doc_keys = [self._doc_keys[n] for n in keep_numbers]
+        self._doc_numbers = {key: n for n, key in enumerate(self._doc_keys)}
+        self._doc_lengths = array("I", (self._doc_lengths[n] for n in keep_numbers))
+        self._doc_terms = [self._doc_terms[n] for n in keep_numbers]
+        self._live = array("B", [1]) * len(self._doc_keys)
+
+    def rebuild(self, documents):
+        with self._lock:
+            self._clear()
+            for key, text in documents:
+                self._add(key, text)
+
+    def search(self, query, k=LEXICAL_SEARCH_K):
+        """[(key, score)] best first; empty when no query term is indexed."""
+        started = time.perf_counter()
+        with self._lock:
+            terms = [self._term_ids[t] for t in set(tokenize(query)) if t in self._term_ids]
+            if not terms or not self._live_count:
+                return []
+            n_docs = self._live_count
+            avg_length = self._live_length / n_docs
+            lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            scores = np.zeros(len(self._doc_keys), dtype=np.float32)
+            for term_id in terms:
+                df = self._df[term_id]
+                if not df:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+                del docs
+            del lengths
+            scores *= np.frombuffer(self._live, dtype=np.uint8)
+
+            hits = np.flatnonzero(scores)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k)[:k]]
+            hits = hits[np.argsort(-scores[hits])]
+            results = [(self._doc_keys[n], float(scores[n])) for n in hits]
+        metrics.observe("lexical_search_seconds", time.perf_counter() - started)
+        return results
+
+
+class LexicalIndex:
+    """Keeps a BM25Index in step with the Postgres docstore.
+
+    load() reads every parent document once. follow() then tails the
+    document-change stream written by index_versions (worker, crawler and
+    admin writes), re-reading only the parents named in each change. Writes
+    whose parent IDs aren't known (e.g. add_documents with generated IDs)
+    are reconciled by diffing the docstore's keys, and a wipe reloads.
+    """
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+        self.bm25 = BM25Index()
+        self.ready = False
+        self._last_event = "0-0"
+        self._stopped = threading.Event()
+
+    def search(self, query, k=LEXICAL_SEARCH_K):
+        if not self.ready:
+            return []
+        return self.bm25.search(query, k)
+
+    def _fetch(self, keys):
+        for start in range(0, len(keys), LOAD_BATCH_SIZE):
+            batch = keys[start:start + LOAD_BATCH_SIZE]
+            for key, doc in zip(batch, self.docstore.mget(batch)):
+                yield key, doc
+
+    def _all_keys(self):
+        return list(self.docstore.yield_keys())
+
+    def load(self, redis_client=None):
+        started = time.perf_counter()
+        if redis_client is not None:
+            # Remember where the stream is before reading, so changes made
+            # while we load are replayed afterwards (upserts are idempotent).
+            try:
+                last = redis_client.xrevrange(DOC_CHANGES_STREAM, count=1)
+                if last:
+                    self._last_event = _text(last[0][0])
+            except Exception as e:
+                logging.warning(f"Lexical index: could not read change stream: {e}")
+        keys = self._all_keys()
+        self.bm25.rebuild((key, document_text(doc)) for key, doc in self._fetch(keys) if doc is not None)
+        self.ready = True
+        print(f"Lexical index: {len(self.bm25)} documents loaded in {time.perf_counter() - started:.2f}s")
+
+    def refresh(self, keys):
+        keys = list(dict.fromkeys(keys))
+        upserts, deletes = [], []
+        for key, doc in self._fetch(keys):
+            if doc is None:
+                deletes.append(key)
+            else:
+                upserts.append((key, document_text(doc)))
+        self.bm25.delete(deletes)
+        self.bm25.upsert(upserts)
+
+    def reconcile(self):
+        stored = set(self._all_keys())
+        indexed = self.bm25.keys()
+        self.bm25.delete(indexed - stored)
+        self.refresh(sorted(stored - indexed))
+
+    def apply(self, events):
+        changed, unknown_write, wipe = [], False, False
+        for _, fields in events:
+            fields = {_text(k): _text(v) for k, v in fields.items()}
+            op = fields.get("op")
+            ids = [i for i in fields.get("ids", "").split(",") if i]
+            if op == "wipe":
+                wipe = True
+            elif ids:
+                changed.extend(ids)
+            else:
+                unknown_write = True
+        if wipe:
+            self.bm25.rebuild([])
+            self.reconcile()
+            return
+        if changed:
+            self.refresh(changed)
+        if unknown_write:
+            self.reconcile()
+
+    def follow(self, redis_client, block_ms=5000):
+        """Blocking loop; run it in a daemon thread."""
+        while not self._stopped.is_set():
+            try:
+                response = redis_client.xread({DOC_CHANGES_STREAM: self._last_event}, count=500, block=block_ms)
+                if not response:
+                    continue
+                events = response[0][1]
+                self.apply(events)
+                self._last_event = _text(events[-1][0])
+                metrics.incr("lexical_index_changes", len(events))
+            except Exception as e:
+                logging.warning(f"Lexical index: sync failed, retrying: {e}")
+                time.sleep(2)
+
+    def start(self, redis_client):
+        def run():
+            try:
+                self.load(redis_client)
+            except Exception as e:
+                print(f"Lexical index: load failed, lexical search disabled: {e}")
+                return
+            if redis_client is not None:
+                self.follow(redis_client)
+
+        thread = threading.Thread(target=run, name="lexical-index", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
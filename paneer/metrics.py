@@ -0,0 +1,34 @@
+import threading
+
+
+class Metrics:
+    """Process-local counters and value summaries, exposed on /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = {"count": 0, "sum": 0.0, "min": value, "max": value}
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self):
+        with self._lock:
+            summaries = {}
+            for name, s in self._summaries.items():
+                summaries[name] = dict(s, avg=s["sum"] / s["count"] if s["count"] else 0.0)
+            return {"counters": dict(self._counters), "summaries": summaries}
+
+
+metrics = Metrics()
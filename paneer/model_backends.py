@@ -0,0 +1,253 @@
+import os
+import json
+import argparse
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# torch: sentence-transformers / HuggingFaceEmbeddings as before.
+# onnx / onnx-int8: the same weights exported by `python model_backends.py
+# export`, run through onnxruntime (int8 = dynamically quantized weights).
+MODEL_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+# 0 lets onnxruntime use every core; lower it when several CPU-pool threads
+# or pre-forked workers run inference at the same time.
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model-int8.onnx"
+META_FILE = "paneer_meta.json"
+
+
+def onnx_model_path(model_name):
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+class OnnxModel:
+    """An exported model directory: tokenizer, fp32/int8 graphs and the
+    pooling / activation settings of the torch model it came from.
+
+    The InferenceSession is created on first use, per process: onnxruntime's
+    thread pool does not survive a fork, so pre-forked workers each open
+    their own (see serve.py).
+    """
+
+    def __init__(self, model_name, quantized=False):
+        from transformers import AutoTokenizer
+
+        self.path = onnx_model_path(model_name)
+        self.model_file = os.path.join(self.path, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(self.model_file):
+            raise FileNotFoundError(
+                f"{self.model_file} not found; run `python model_backends.py export` first."
+            )
+        with open(os.path.join(self.path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.path)
+        self.max_length = self.meta["max_length"]
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime as ort
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(
+                        self.model_file, options, providers=["CPUExecutionProvider"]
+                    )
+                    self._input_names = {i.name for i in self._session.get_inputs()}
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def run(self, *texts):
+        encoded = self.tokenizer(
+            *texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        session = self.session
+        feed = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._input_names}
+        return session.run(None, feed)[0], encoded["attention_mask"]
+
+
+class OnnxEmbeddings(Embeddings):
+    """Drop-in for HuggingFaceEmbeddings: mean pooling over the last hidden
+    state, L2-normalized like the sentence-transformers pipeline."""
+
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, quantized=False, batch_size=32):
+        self.model = OnnxModel(model_name, quantized=quantized)
+        self.batch_size = batch_size
+
+    def _encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            hidden, mask = self.model.run(texts[start:start + self.batch_size])
+            mask = mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.model.meta.get("normalize", True):
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        texts = [t.replace("\n", " ") for t in texts]
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class OnnxCrossEncoder:
+    """Drop-in for sentence_transformers.CrossEncoder.predict()."""
+
+    def __init__(self, model_name=DEFAULT_RERANKER_MODEL, quantized=False):
+        self.model = OnnxModel(model_name, quantized=quantized)
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            logits, _ = self.model.run([q for q, _ in batch], [d for _, d in batch])
+            scores.append(logits[:, 0])
+        scores = np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+        if self.model.meta.get("activation") == "sigmoid":
+            scores = 1 / (1 + np.exp(-scores))
+        return scores
+
+
+def _check_backend(backend):
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {MODEL_BACKENDS}")
+
+
+def create_embeddings(model_name=DEFAULT_EMBEDDING_MODEL, backend=None):
+    backend = backend or EMBEDDING_BACKEND
+    _check_backend(backend)
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return OnnxEmbeddings(model_name, quantized=backend == "onnx-int8")
+
+
+def create_reranker(model_name=DEFAULT_RERANKER_MODEL, backend=None):
+    backend = backend or RERANKER_BACKEND
+    _check_backend(backend)
+    if backend == "torch":
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
+    return OnnxCrossEncoder(model_name, quantized=backend == "onnx-int8")
+
+
+def _export(model, tokenizer, out_dir, meta, sample, output_name):
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    encoded = tokenizer(*sample, padding=True, truncation=True, max_length=meta["max_length"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in encoded]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"} if output_name == "logits" else {0: "batch", 1: "sequence"}
+
+    model.eval()
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(encoded[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    print(f"Exported {fp32_path}")
+
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Quantized {int8_path}")
+
+
+def export_embedder(model_name=DEFAULT_EMBEDDING_MODEL):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    meta = {
+        "source_model": model_name,
+        "kind": "embedding",
+        "max_length": st_model.max_seq_length,
+        "normalize": any(type(m).__name__ == "Normalize" for m in st_model),
+    }
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(*inputs).last_hidden_state
+
+    sample = (["a sample query about NIT Trichy", "another, slightly longer sample sentence"],)
+    _export(LastHiddenState(transformer.auto_model), transformer.tokenizer,
+            onnx_model_path(model_name), meta, sample, "last_hidden_state")
+
+
+def export_reranker(model_name=DEFAULT_RERANKER_MODEL):
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    cross_encoder = CrossEncoder(model_name, device="cpu")
+    activation = getattr(cross_encoder, "activation_fn", None) or getattr(cross_encoder, "default_activation_function", None)
+    meta = {
+        "source_model": model_name,
+        "kind": "reranker",
+        "max_length": cross_encoder.max_length or cross_encoder.tokenizer.model_max_length,
+        "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity",
+    }
+
+    class Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(*inputs).logits
+
+    sample = (["hostel fees", "who is the director"], ["The hostel fee is ...", "The director of NIT Trichy is ..."])
+    _export(Logits(cross_encoder.model), cross_encoder.tokenizer,
+            onnx_model_path(model_name), meta, sample, "logits")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedder / reranker to ONNX (fp32 + int8).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export")
+    export.add_argument("--embedding-model", default=DEFAULT_EMBEDDING_MODEL)
+    export.add_argument("--reranker-model", default=DEFAULT_RERANKER_MODEL)
+    export.add_argument("--only", choices=["embedding", "reranker"])
+    args = parser.parse_args()
+
+    print(f"Writing models to {ONNX_MODEL_DIR}")
+    if args.only in (None, "embedding"):
+        export_embedder(args.embedding_model)
+    if args.only in (None, "reranker"):
+        export_reranker(args.reranker_model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import uuid
+
+# ParentDocumentRetriever splits what it is given with its parent_splitter
+# and then wants one ID per resulting parent, so a caller that passes (and
+# publishes, see index_versions) its own IDs has to split first. A document
+# added under a known ID keeps that ID for its first parent; the others get
+# "<id>#<n>", which parent_ids() finds again when the document is replaced
+# or deleted.
+
+
+def split_parents(retriever, documents, doc_id=None):
+    """Returns (parents, parent IDs) for `documents` as `retriever` would
+    store them. `doc_id` names a single document; without it every parent
+    gets a fresh UUID."""
+    splitter = getattr(retriever, "parent_splitter", None)
+    parents = splitter.split_documents(documents) if splitter else list(documents)
+    if doc_id is None:
+        return parents, [str(uuid.uuid4()) for _ in parents]
+    return parents, [doc_id] + [f"{doc_id}#{n}" for n in range(1, len(parents))]
+
+
+def add_parents(retriever, documents, doc_id=None):
+    """Adds `documents` and returns the parent IDs written."""
+    parents, ids = split_parents(retriever, documents, doc_id)
+    if parents:
+        retriever.add_documents(parents, ids=ids)
+    return ids
+
+
+def parent_ids(retriever, doc_id):
+    """IDs of every parent stored for the document added as `doc_id`."""
+    prefix = f"{doc_id}#"
+    # The Postgres store matches prefixes with LIKE, where "_" is a wildcard.
+    return [doc_id] + [key for key in retriever.docstore.yield_keys(prefix=prefix) if key.startswith(prefix)]
+
+
+def delete_parents(retriever, doc_ids):
+    """Removes the given parents' child chunks from the vectorstore and the
+    parents from the docstore."""
+    if not doc_ids:
+        return
+    id_key = getattr(retriever, "id_key", "doc_id")
+    try:
+        retriever.vectorstore.delete(where={id_key: {"$in": list(doc_ids)}})
+    except Exception as e:
+        print(f"Warning: Failed to cleanup vectorstore chunks for {doc_ids}: {e}")
+    retriever.docstore.mdelete(list(doc_ids))
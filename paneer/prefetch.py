@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import asyncio
+import numpy as np
+from metrics import metrics
+
+SPECULATIVE_PREFETCH_ENABLED = os.getenv("SPECULATIVE_PREFETCH_ENABLED", "false").lower() == "true"
+# Cosine similarity (query embeddings) above which the model's search query
+# is answered with a prefetched result.
+PREFETCH_SIMILARITY = float(os.getenv("PREFETCH_SIMILARITY", 0.8))
+PREFETCH_MAX_QUERIES = int(os.getenv("PREFETCH_MAX_QUERIES", 2))
+# Longer messages rarely resemble the query the model writes.
+PREFETCH_MAX_CHARS = 300
+
+# Runs of capitalised words ("Hostel Opal", "Dr. R. Vasu", "Department of CSE").
+_ENTITY = re.compile(r"[A-Z][\w.&'-]*(?:\s+(?:of\s+|and\s+|for\s+)?[A-Z][\w.&'-]*)*")
+_LEADING_WORDS = frozenset(
+    "what who whom which when where why how is are was were can could does do did tell give list show "
+    "please i hi hello hey the a an".split()
+)
+
+
+def extract_entities(message):
+    entities = []
+    for match in _ENTITY.finditer(message):
+        words = match.group().split()
+        while words and words[0].lower().rstrip(".") in _LEADING_WORDS:
+            words.pop(0)
+        if words:
+            entities.append(" ".join(words).rstrip(".?!,"))
+    return list(dict.fromkeys(e for e in entities if e))
+
+
+def prefetch_queries(message, max_queries=PREFETCH_MAX_QUERIES):
+    """The raw message, plus its named entities phrased the way the system
+    prompt tells the model to search ("Vasu NIT Trichy")."""
+    message = " ".join(message.split())
+    if not message or len(message) > PREFETCH_MAX_CHARS:
+        return []
+    queries = [message]
+    entities = extract_entities(message)
+    if entities:
+        query = " ".join(entities)
+        if "nit" not in query.lower():
+            query = f"{query} NIT Trichy"
+        if query.lower() != message.lower():
+            queries.append(query)
+    return queries[:max_queries]
+
+
+class _Speculation:
+    def __init__(self, query):
+        self.query = query
+        self.vector = None
+        self.result = None
+        self.started = time.perf_counter()
+        self.finished = None
+        self.used = False
+
+
+class SpeculativePrefetch:
+    """Searches started on the user's message while the first model call is
+    still streaming.
+
+    `search` is the tool's async search (query -> (text, doc_ids, scores)) and
+    `embed` an async query embedder. When the model then calls the tool,
+    match() hands back the prefetched result whose query embeds closest to
+    the model's, if it's within PREFETCH_SIMILARITY; otherwise the tool
+    searches as usual. close() cancels whatever is still running.
+    """
+
+    def __init__(self, search, embed, threshold=PREFETCH_SIMILARITY):
+        self.search = search
+        self.embed = embed
+        self.threshold = threshold
+        self._speculations = []
+
+    def start(self, message):
+        for query in prefetch_queries(message):
+            self._speculations.append(self._launch(query))
+        if self._speculations:
+            metrics.incr("prefetch_started", len(self._speculations))
+
+    def _launch(self, query):
+        speculation = _Speculation(query)
+
+        async def run():
+            try:
+                return await self.search(query)
+            finally:
+                speculation.finished = time.perf_counter()
+
+        speculation.vector = asyncio.create_task(self.embed(query))
+        speculation.result = asyncio.create_task(run())
+        return speculation
+
+    async def match(self, query):
+        """Prefetched (text, doc_ids, scores) for a query similar to `query`, or None."""
+        if not self._speculations:
+            return None
+        asked = time.perf_counter()
+        vector = np.asarray(await self.embed(query), dtype=np.float32)
+        best, best_similarity = None, self.threshold
+        for speculation in self._speculations:
+            try:
+                other = np.asarray(await asyncio.shield(speculation.vector), dtype=np.float32)
+            except Exception:
+                continue
+            similarity = float(vector @ other / ((np.linalg.norm(vector) * np.linalg.norm(other)) or 1.0))
+            if similarity >= best_similarity:
+                best, best_similarity = speculation, similarity
+
+        result = None
+        if best is not None:
+            try:
+                result = await asyncio.shield(best.result)
+            except Exception:
+                result = None
+        if result is None or result[1] is None:
+            # No close enough query, or the prefetched search failed.
+            metrics.incr("prefetch_misses")
+            return None
+
+        best.used = True
+        waited = time.perf_counter() - asked
+        metrics.incr("prefetch_hits")
+        metrics.observe("prefetch_similarity", best_similarity)
+        metrics.observe("prefetch_time_saved_seconds", max(0.0, best.finished - best.started - waited))
+        print(f"PREFETCH: reused '{best.query}' for '{query}' (similarity {best_similarity:.2f})")
+        return result
+
+    def close(self):
+        for speculation in self._speculations:
+            if not speculation.used:
+                metrics.incr("prefetch_unused")
+            for task in (speculation.vector, speculation.result):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()
+        self._speculations = []
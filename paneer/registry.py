@@ -0,0 +1,102 @@
+import os
+import time
+import resource
+import threading
+
+PROCESS_STARTED = time.time()
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Peak rather than current RSS, but close enough where /proc is missing.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """Loads each model / client once per process, on first use.
+
+    Loaders for different components run in parallel; concurrent callers
+    for the same component wait for the one load already in progress. A
+    loader that returns None (e.g. a backend was unreachable) is not
+    cached, so the next caller tries again. Load time and the RSS growth
+    seen while loading are kept per component for stats().
+
+    Components holding sockets (database / HTTP clients) should be
+    registered with fork_safe=False: a forked child drops them and loads
+    its own, while model weights are kept and shared copy-on-write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._component_locks = {}
+        self._components = {}
+        self._stats = {}
+        self._fork_unsafe = set()
+        self.ready_at = None
+
+    def get(self, name, loader, fork_safe=True):
+        component = self._components.get(name)
+        if component is not None:
+            return component
+
+        with self._lock:
+            component_lock = self._component_locks.setdefault(name, threading.Lock())
+        with component_lock:
+            component = self._components.get(name)
+            if component is not None:
+                return component
+
+            rss_before = current_rss_mb()
+            started = time.perf_counter()
+            component = loader()
+            if component is None:
+                return None
+            self._stats[name] = {
+                "load_seconds": round(time.perf_counter() - started, 3),
+                "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+                "loaded_at": round(time.time() - PROCESS_STARTED, 3),
+            }
+            self._components[name] = component
+            if not fork_safe:
+                self._fork_unsafe.add(name)
+            print(f"Registry: loaded {name} in {self._stats[name]['load_seconds']}s "
+                  f"(+{self._stats[name]['rss_delta_mb']} MB RSS)")
+            return component
+
+    def reset_after_fork(self):
+        global PROCESS_STARTED
+        PROCESS_STARTED = time.time()
+        # Locks may have been held by another thread of the parent at fork time.
+        self._lock = threading.Lock()
+        self._component_locks = {}
+        for name in self._fork_unsafe:
+            self._components.pop(name, None)
+            self._stats.pop(name, None)
+        self._fork_unsafe = set()
+        self.ready_at = None
+
+    def loaded(self, name):
+        return name in self._components
+
+    def record(self, name, **values):
+        self._stats.setdefault(name, {}).update(values)
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.time()
+
+    def stats(self):
+        return {
+            "startup_seconds": round(self.ready_at - PROCESS_STARTED, 3) if self.ready_at else None,
+            "uptime_seconds": round(time.time() - PROCESS_STARTED, 3),
+            "rss_mb": round(current_rss_mb(), 1),
+            "components": {name: dict(values) for name, values in self._stats.items()},
+        }
+
+
+registry = ModelRegistry()
+os.register_at_fork(after_in_child=registry.reset_after_fork)
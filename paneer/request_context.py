@@ -0,0 +1,31 @@
+from contextvars import ContextVar
+
+# Parent doc IDs returned by search_nitt_data during the current chat turn.
+# chat_generator sets a fresh list per turn; tool calls run in tasks that
+# inherit the context, so they append to the same list.
+retrieved_doc_ids = ContextVar("retrieved_doc_ids", default=None)
+
+
+def record_retrieved_docs(doc_ids):
+    collected = retrieved_doc_ids.get()
+    if collected is None:
+        return
+    for doc_id in doc_ids:
+        if doc_id and doc_id not in collected:
+            collected.append(doc_id)
+
+# The current chat turn's dict (see api.agent_loop). A search that failed or
+# found nothing marks it, so the answer isn't kept in the answer cache.
+current_turn = ContextVar("current_turn", default=None)
+
+
+def mark_turn_uncacheable():
+    turn = current_turn.get()
+    if turn is not None:
+        turn["uncacheable"] = True
+
+# The SpeculativePrefetch started for the current chat turn, if any.
+active_prefetch = ContextVar("active_prefetch", default=None)
+
+# The chat session's WorkingSet (see working_set.py) for the current turn.
+session_working_set = ContextVar("session_working_set", default=None)
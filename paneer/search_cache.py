@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import zstandard
+from index_versions import aget_index_generation
+from metrics import metrics
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 1000))
+SEARCH_CACHE_REDIS = os.getenv("SEARCH_CACHE_REDIS", "false").lower() == "true"
+
+
+def normalize_query(query):
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?.!,;:'\"")
+
+
+class _InflightSearch:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SearchResultCache:
+    """Caches search_nitt_data results by normalized query and index generation.
+
+    Every write to the index bumps the generation (see index_versions), so
+    a result is never served across a write; old generations simply age out.
+    Lookups hit an in-process TTL/LRU tier first and, when `use_redis` is
+    set, a shared Redis tier next. Identical searches that arrive while one
+    is already running wait for that execution instead of starting another;
+    it is cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self, redis_client=None, ttl=SEARCH_CACHE_TTL_SECONDS,
+                 max_entries=SEARCH_CACHE_MAX_ENTRIES, use_redis=SEARCH_CACHE_REDIS):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_redis = use_redis and redis_client is not None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    async def _generation(self):
+        if self.redis is None:
+            return 0
+        try:
+            return await aget_index_generation(self.redis)
+        except Exception as e:
+            # Without the generation we can't tell whether a result is stale.
+            print(f"SEARCH_CACHE: could not read index generation ({e}), bypassing cache.")
+            return None
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _redis_key(self, key):
+        return "search_cache:v2:" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    async def _get_shared(self, key):
+        try:
+            raw = await self.redis.get(self._redis_key(key))
+            if raw:
+                return json.loads(self._decompressor.decompress(raw))
+        except Exception as e:
+            print(f"SEARCH_CACHE: Redis read failed: {e}")
+        return None
+
+    async def _put_shared(self, key, value):
+        try:
+            payload = self._compressor.compress(json.dumps(value).encode("utf-8"))
+            await self.redis.setex(self._redis_key(key), self.ttl, payload)
+        except Exception as e:
+            print(f"SEARCH_CACHE: Redis write failed: {e}")
+
+    async def get_or_search(self, query, search):
+        """`search` is an async callable returning (text, doc_ids, scores);
+        doc_ids is None for results that must not be cached (e.g. errors)."""
+        generation = await self._generation()
+        if generation is None:
+            return await search(query)
+
+        key = f"{generation}:{normalize_query(query)}"
+        value = self._get_local(key)
+        if value is not None:
+            metrics.incr("search_cache_hits")
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            metrics.incr("search_cache_coalesced")
+        else:
+            metrics.incr("search_cache_misses")
+            inflight = self._inflight[key] = _InflightSearch(asyncio.ensure_future(self._fill(key, query, search)))
+            inflight.task.add_done_callback(lambda _: self._forget(key, inflight))
+        inflight.waiters += 1
+        try:
+            # Shielded so one caller going away doesn't cancel the search for
+            # everyone else waiting on it.
+            return await asyncio.shield(inflight.task)
+        finally:
+            inflight.waiters -= 1
+            if not inflight.waiters and not inflight.task.done():
+                # The last caller was cancelled (e.g. the client disconnected).
+                self._forget(key, inflight)
+                inflight.task.cancel()
+                metrics.incr("search_cache_searches_cancelled")
+
+    def _forget(self, key, inflight):
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
+
+    async def _fill(self, key, query, search):
+        if self.use_redis:
+            value = await self._get_shared(key)
+            if value is not None:
+                metrics.incr("search_cache_shared_hits")
+                value = tuple(value)
+                self._put_local(key, value)
+                return value
+
+        value = await search(query)
+        if value[1] is not None:
+            self._put_local(key, value)
+            if self.use_redis:
+                await self._put_shared(key, list(value))
+        return value
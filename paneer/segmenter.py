@@ -0,0 +1,93 @@
+class TagSegmenter:
+    """Incrementally splits streamed model output on inline tags.
+
+    `tags` maps a tag name to the segment kind its contents are reported as,
+    e.g. {"thinking": "thought_chunk"}; text outside any tag is reported as
+    `default`. Tags do not nest: inside <x> only </x> is recognised. Each
+    call to feed() scans the new text once and holds back at most one
+    partial tag (shorter than the longest tag) until the next chunk decides
+    it, so the cost per chunk is independent of how much has been streamed.
+    """
+
+    def __init__(self, tags, default="text_chunk"):
+        self.default = default
+        self.kinds = dict(tags)
+        self.open_tags = {f"<{name}>": name for name in self.kinds}
+        self.close_tags = {name: f"</{name}>" for name in self.kinds}
+
+        # Every proper prefix of every tag that can appear in a given state;
+        # used to decide whether a trailing "<..." has to be held back.
+        self._open_prefixes = {t[:i] for t in self.open_tags for i in range(1, len(t))}
+        self._close_prefixes = {
+            name: {t[:i] for i in range(1, len(t))} for name, t in self.close_tags.items()
+        }
+        self._max_tag_len = max(
+            [len(t) for t in self.open_tags] + [len(t) for t in self.close_tags.values()]
+        )
+
+        self.current = None
+        self._pending = ""
+
+    @property
+    def kind(self):
+        return self.kinds[self.current] if self.current else self.default
+
+    def feed(self, text):
+        if not text:
+            return []
+
+        data = self._pending + text if self._pending else text
+        self._pending = ""
+        segments = []
+        start = 0
+        pos = data.find("<")
+
+        while pos != -1:
+            remaining = len(data) - pos
+            if self.current is None:
+                matched = None
+                for tag, name in self.open_tags.items():
+                    if data.startswith(tag, pos):
+                        matched = (tag, name)
+                        break
+                if matched:
+                    self._emit(segments, data[start:pos])
+                    self.current = matched[1]
+                    start = pos + len(matched[0])
+                    pos = data.find("<", start)
+                    continue
+                if remaining < self._max_tag_len and data[pos:] in self._open_prefixes:
+                    break
+            else:
+                tag = self.close_tags[self.current]
+                if data.startswith(tag, pos):
+                    self._emit(segments, data[start:pos])
+                    self.current = None
+                    start = pos + len(tag)
+                    pos = data.find("<", start)
+                    continue
+                if remaining < len(tag) and data[pos:] in self._close_prefixes[self.current]:
+                    break
+            pos = data.find("<", pos + 1)
+
+        if pos != -1:
+            self._emit(segments, data[start:pos])
+            self._pending = data[pos:]
+        else:
+            self._emit(segments, data[start:])
+        return segments
+
+    def flush(self):
+        segments = []
+        self._emit(segments, self._pending)
+        self._pending = ""
+        return segments
+
+    def _emit(self, segments, text):
+        if not text:
+            return
+        kind = self.kind
+        if segments and segments[-1][0] == kind:
+            segments[-1] = (kind, segments[-1][1] + text)
+        else:
+            segments.append((kind, text))
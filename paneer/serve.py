@@ -0,0 +1,130 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+# Forked workers must not inherit a tokenizer thread pool from the master.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKERS = int(os.getenv("PANEER_WORKERS", os.cpu_count() or 1))
+HOST = os.getenv("PANEER_HOST", "0.0.0.0")
+PORT = int(os.getenv("PANEER_PORT", 8000))
+
+# Pre-fork launcher: the master loads the embedder and reranker once, then
+# forks workers that share those weights copy-on-write. Everything holding a
+# socket (Redis, Mongo, Postgres, Chroma, Groq HTTP clients) is created in the
+# workers when they import api, never in the master.
+
+
+def preload_models():
+    from app import get_embeddings, get_reranker
+    from registry import registry
+
+    get_embeddings()
+    get_reranker()
+    # No warm-up inference here: torch/OpenMP thread pools started before a
+    # fork don't survive it. Each worker warms up after it starts.
+    print(f"Master: models loaded, {registry.stats()['rss_mb']} MB RSS")
+
+
+def run_worker(sock, args):
+    from registry import registry
+    import uvicorn
+    import api
+
+    registry.record("worker", pid=os.getpid())
+    config = uvicorn.Config(
+        api.app,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        log_level=args.log_level,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock, args):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # Objects frozen in the master stay frozen here too, so collections in
+        # the worker never touch (and unshare) the pages holding the models.
+        code = 0
+        try:
+            run_worker(sock, args)
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"Master: started worker {pid}")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run paneer with pre-forked workers sharing one copy of the models.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    preload_models()
+
+    # Move everything allocated so far into the permanent generation, so the
+    # collector in each worker doesn't write to (and copy) those pages.
+    gc.collect()
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Master {os.getpid()}: serving on {args.host}:{args.port} with {args.workers} workers")
+    for _ in range(args.workers):
+        workers.add(spawn(sock, args))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Master: worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            workers.add(spawn(sock, args))
+
+    sock.close()
+    print("Master: all workers stopped")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import zstandard
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 86400))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", 40))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+
+
+def estimate_tokens(text):
+    # Same ~4 chars/token heuristic the crawler pipeline batches on.
+    return len(text) // 4 + 1
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(str(m.content)) for m in messages)
+
+
+def turns_to_messages(turns):
+    messages = []
+    for turn in turns:
+        messages.extend(messages_from_dict(turn["messages"]))
+    return messages
+
+
+class RedisSessionStore:
+    """Chat history as a Redis list with one zstd-compressed entry per turn.
+
+    Appending a turn is a single RPUSH (plus LTRIM/EXPIRE in the same
+    pipeline), so the cost no longer grows with the conversation, and the list
+    is trimmed to the newest `max_turns` turns. load() returns only the most
+    recent turns that fit in `token_budget`.
+
+    A small hash next to the list counts every turn ever appended (so turns
+    keep a stable number across LTRIMs) and holds the rolling summary written
+    by summarizer.RollingSummarizer, if one is in use.
+    """
+
+    def __init__(self, redis_client, ttl=SESSION_TTL_SECONDS, max_turns=SESSION_MAX_TURNS,
+                 token_budget=HISTORY_TOKEN_BUDGET):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def turns_key(self, session_id):
+        return f"session:{session_id}:turns"
+
+    def meta_key(self, session_id):
+        return f"session:{session_id}:meta"
+
+    def legacy_key(self, session_id):
+        return f"session:{session_id}"
+
+    def _encode(self, messages):
+        entry = {"tokens": message_tokens(messages), "messages": messages_to_dict(messages)}
+        return self._compressor.compress(json.dumps(entry).encode("utf-8"))
+
+    def _decode(self, raw):
+        return json.loads(self._decompressor.decompress(raw))
+
+    async def append_turn(self, session_id, messages):
+        key = self.turns_key(session_id)
+        meta_key = self.meta_key(session_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(key, self._encode(messages))
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, self.ttl)
+        pipe.hincrby(meta_key, "appended", 1)
+        pipe.expire(meta_key, self.ttl)
+        await pipe.execute()
+
+    async def load_state(self, session_id):
+        """Returns (turns, meta). Each turn carries its absolute turn number
+        under "num"; meta holds the decoded fields of the meta hash."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lrange(self.turns_key(session_id), -self.max_turns, -1)
+        pipe.hgetall(self.meta_key(session_id))
+        raw_turns, raw_meta = await pipe.execute()
+
+        meta = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw_meta.items()
+        }
+        if not raw_turns:
+            return await self._migrate_legacy(session_id), meta
+
+        # Sessions written before the counter existed number from the list start.
+        first_num = max(int(meta.get("appended", len(raw_turns))) - len(raw_turns), 0) + 1
+
+        turns = []
+        for i, raw in enumerate(raw_turns):
+            try:
+                turn = self._decode(raw)
+            except Exception as e:
+                print(f"Skipping unreadable history entry for {session_id}: {e}")
+                continue
+            turn["num"] = first_num + i
+            turns.append(turn)
+        return turns, meta
+
+    async def load_turns(self, session_id):
+        return (await self.load_state(session_id))[0]
+
+    def recent_window(self, turns, token_budget=None):
+        # Walk back from the newest turn until the budget is spent. The latest
+        # turn is always kept so follow-up questions have something to refer to.
+        budget = self.token_budget if token_budget is None else token_budget
+        window = []
+        used = 0
+        for turn in reversed(turns):
+            if window and used + turn["tokens"] > budget:
+                break
+            window.append(turn)
+            used += turn["tokens"]
+        window.reverse()
+        return window
+
+    async def load(self, session_id):
+        return turns_to_messages(self.recent_window(await self.load_turns(session_id)))
+
+    async def save_summary(self, session_id, summary, through):
+        meta_key = self.meta_key(session_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(meta_key, mapping={
+            "summary": summary,
+            "summary_through": through,
+            "summary_tokens": estimate_tokens(summary),
+        })
+        pipe.expire(meta_key, self.ttl)
+        await pipe.execute()
+
+    async def _migrate_legacy(self, session_id):
+        # Sessions written before the list store hold the whole history as
+        # one JSON blob under session:{id}; convert it on first read.
+        legacy_key = self.legacy_key(session_id)
+        raw_history = await self.redis.get(legacy_key)
+        if not raw_history:
+            return []
+
+        try:
+            history = messages_from_dict(json.loads(raw_history))
+        except Exception as e:
+            print(f"Error loading legacy history for {session_id}: {e}")
+            return []
+
+        turns = []
+        for i in range(0, len(history), 2):
+            pair = history[i:i + 2]
+            turns.append({"tokens": message_tokens(pair), "messages": messages_to_dict(pair)})
+        turns = turns[-self.max_turns:]
+
+        key = self.turns_key(session_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(key)
+        for turn in turns:
+            pipe.rpush(key, self._compressor.compress(json.dumps(turn).encode("utf-8")))
+        pipe.expire(key, self.ttl)
+        pipe.hset(self.meta_key(session_id), "appended", len(turns))
+        pipe.expire(self.meta_key(session_id), self.ttl)
+        pipe.delete(legacy_key)
+        await pipe.execute()
+
+        for i, turn in enumerate(turns):
+            turn["num"] = i + 1
+        return turns
@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+from langchain_core.messages import SystemMessage, HumanMessage
+from session_store import estimate_tokens, turns_to_messages
+from metrics import metrics
+
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+# Un-summarized history above this size gets folded into the running summary.
+HISTORY_SUMMARY_TRIGGER_TOKENS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", 2000))
+# Most recent turns kept verbatim after a fold.
+HISTORY_RECENT_TOKENS = int(os.getenv("HISTORY_RECENT_TOKENS", 800))
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a student and WikiNITT, the NIT Trichy assistant.
+
+EXISTING SUMMARY:
+{summary}
+
+NEW TURNS TO FOLD IN:
+{turns}
+
+Rewrite the summary so it covers both. Keep names of people, departments, hostels, dates, fees, URLs and any facts the assistant gave, plus what the student was trying to find out. Drop pleasantries and reasoning. Output only the summary text, at most 200 words."""
+
+
+class RollingSummarizer:
+    """Caps the history sent to the model by folding old turns into a summary.
+
+    The summary lives in the session's meta hash (see RedisSessionStore) along
+    with the number of the last turn it covers. load() only reads it: the
+    model call that folds older turns in runs in the background after a turn
+    is saved (schedule_fold), once the un-summarized turns grow past
+    `trigger_tokens`, and the next turn picks the new summary up.
+    """
+
+    def __init__(self, llm, store, trigger_tokens=HISTORY_SUMMARY_TRIGGER_TOKENS,
+                 recent_tokens=HISTORY_RECENT_TOKENS):
+        self.llm = llm
+        self.store = store
+        self.trigger_tokens = trigger_tokens
+        self.recent_tokens = recent_tokens
+        self._folding = {}
+
+    async def load(self, session_id):
+        turns, meta = await self.store.load_state(session_id)
+        summary = meta.get("summary", "")
+        through = int(meta.get("summary_through", 0))
+
+        pending = [t for t in turns if t["num"] > through]
+        if sum(t["tokens"] for t in pending) > self.trigger_tokens:
+            # A fold is due (or still running); send what fits meanwhile.
+            pending = self.store.recent_window(pending)
+
+        messages = []
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        messages.extend(turns_to_messages(pending))
+
+        full_tokens = sum(t["tokens"] for t in turns)
+        sent_tokens = sum(t["tokens"] for t in pending) + (estimate_tokens(summary) if summary else 0)
+        saved = max(full_tokens - sent_tokens, 0)
+        metrics.observe("history_prompt_tokens_saved", saved)
+        metrics.observe("history_prompt_tokens", sent_tokens)
+        return messages, saved
+
+    def schedule_fold(self, session_id):
+        """Starts fold() for the session unless one is already running."""
+        if session_id in self._folding:
+            return
+        task = asyncio.create_task(self.fold(session_id))
+        self._folding[session_id] = task
+        task.add_done_callback(lambda _: self._folding.pop(session_id, None))
+
+    async def fold(self, session_id):
+        try:
+            turns, meta = await self.store.load_state(session_id)
+            summary = meta.get("summary", "")
+            through = int(meta.get("summary_through", 0))
+            pending = [t for t in turns if t["num"] > through]
+            if sum(t["tokens"] for t in pending) <= self.trigger_tokens:
+                return
+            recent = self.store.recent_window(pending, self.recent_tokens)
+            fold = pending[:len(pending) - len(recent)]
+            if not fold:
+                return
+            started = time.perf_counter()
+            summary = await self._fold(summary, fold)
+            await self.store.save_summary(session_id, summary, fold[-1]["num"])
+            metrics.incr("history_summaries_created")
+            metrics.observe("history_summary_seconds", time.perf_counter() - started)
+        except Exception as e:
+            print(f"History summarization failed for {session_id}: {e}")
+
+    async def _fold(self, summary, turns):
+        lines = []
+        for message in turns_to_messages(turns):
+            role = "Student" if isinstance(message, HumanMessage) else "WikiNITT"
+            lines.append(f"{role}: {message.content}")
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns="\n".join(lines))
+        response = await self.llm.ainvoke(prompt)
+        return str(response.content).strip()
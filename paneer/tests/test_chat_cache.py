@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+import api
+from request_context import record_retrieved_docs
+
+
+class ChatModel:
+    # Calls the search tool twice on the first step, then answers.
+    async def astream(self, messages, **kwargs):
+        if len(messages) == 2:
+            yield AIMessageChunk(content="", tool_calls=[
+                {"name": "search_nitt_data", "args": {"query": "hostel fee"}, "id": "call_1"},
+                {"name": "search_nitt_data", "args": {"query": "mess advance"}, "id": "call_2"},
+            ])
+        else:
+            yield AIMessageChunk(content="The fee is listed.")
+
+
+class Search:
+    name = "search_nitt_data"
+
+    def __init__(self, results):
+        # query -> parent IDs found, or an exception to raise
+        self.results = results
+
+    async def ainvoke(self, args):
+        found = self.results[args["query"]]
+        if isinstance(found, Exception):
+            raise found
+        record_retrieved_docs(found)
+        return "Source: https://www.nitt.edu\nHostel fee circular" if found else "No results found."
+
+
+class SessionStore:
+    async def load(self, session_id):
+        return []
+
+    async def append_turn(self, session_id, messages):
+        pass
+
+
+class AnswerCache:
+    def __init__(self):
+        self.stored = []
+
+    async def lookup(self, vector):
+        return None
+
+    async def store(self, vector, question, frames, answer, doc_ids):
+        self.stored.append((answer, list(doc_ids)))
+
+
+async def embed(text):
+    return [1.0, 0.0]
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    cache = AnswerCache()
+    monkeypatch.setattr(api, "answer_cache", cache)
+    monkeypatch.setattr(api, "aembed_query", embed)
+    monkeypatch.setattr(api, "retriever", object())
+    monkeypatch.setattr(api, "session_store", SessionStore())
+    monkeypatch.setattr(api, "working_set_store", None)
+    monkeypatch.setattr(api, "HISTORY_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(api, "llm_with_tools", ChatModel())
+    return cache
+
+
+def chat(monkeypatch, results):
+    monkeypatch.setattr(api, "tools_map", {"search_nitt_data": Search(results)})
+
+    async def run():
+        return [frame async for frame in api.chat_generator("What is the hostel fee?", "session")]
+
+    return asyncio.run(run())
+
+
+def test_answer_is_cached(monkeypatch, answer_cache):
+    chat(monkeypatch, {"hostel fee": ["doc-1"], "mess advance": ["doc-2"]})
+    assert answer_cache.stored == [("The fee is listed.", ["doc-1", "doc-2"])]
+
+
+def test_answer_without_documents_is_not_cached(monkeypatch, answer_cache):
+    chat(monkeypatch, {"hostel fee": [], "mess advance": []})
+    assert answer_cache.stored == []
+
+
+def test_answer_after_failed_search_is_not_cached(monkeypatch, answer_cache):
+    chat(monkeypatch, {"hostel fee": ["doc-1"], "mess advance": RuntimeError("chroma down")})
+    assert answer_cache.stored == []
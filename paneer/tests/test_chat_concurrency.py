@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+import api
+
+MODEL_DELAY = 0.2
+SEARCH_DELAY = 0.3
+CHATS = 8
+
+
+class SlowChatModel:
+    # Streams a search call on the first step and an answer on the second,
+    # taking MODEL_DELAY per step like a Groq round trip would.
+    async def astream(self, messages, **kwargs):
+        await asyncio.sleep(MODEL_DELAY)
+        if len(messages) == 2:
+            yield AIMessageChunk(content="", tool_calls=[
+                {"name": "search_nitt_data", "args": {"query": "hostel fee"}, "id": "call_1"}
+            ])
+        else:
+            for word in ("The ", "fee ", "is ", "listed."):
+                yield AIMessageChunk(content=word)
+
+
+class SlowSearch:
+    name = "search_nitt_data"
+
+    async def ainvoke(self, args):
+        await asyncio.sleep(SEARCH_DELAY)
+        return "Source: https://www.nitt.edu\nHostel fee circular"
+
+
+async def run_turn():
+    turn = {"answer": None, "error": False}
+    messages = [api.SYSTEM_MESSAGE, HumanMessage(content="What is the hostel fee?")]
+    frames = [frame async for frame in api.agent_loop(messages, turn)]
+    assert not turn["error"], frames
+    return turn
+
+
+async def run_load():
+    # Longest gap between ticks of a 10 ms heartbeat: anything blocking the
+    # event loop during a turn shows up here.
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal lag
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - before - 0.01)
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    turns = await asyncio.gather(*[run_turn() for _ in range(CHATS)])
+    wall = time.perf_counter() - started
+    done.set()
+    await beat
+    return turns, wall, lag
+
+
+def test_concurrent_turns_overlap(monkeypatch):
+    monkeypatch.setattr(api, "llm_with_tools", SlowChatModel())
+    monkeypatch.setattr(api, "tools_map", {"search_nitt_data": SlowSearch()})
+
+    turns, wall, lag = asyncio.run(run_load())
+
+    assert all(turn["answer"] == "The fee is listed." for turn in turns)
+    one_turn = 2 * MODEL_DELAY + SEARCH_DELAY
+    # Serialised turns would take CHATS * one_turn.
+    assert wall < 2 * one_turn, f"{CHATS} turns took {wall:.2f}s, one takes {one_turn:.2f}s"
+    assert lag < 0.1, f"event loop blocked for {lag:.3f}s"
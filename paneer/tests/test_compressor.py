@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+
+from compressor import compress_docs, clip_span
+from session_store import estimate_tokens
+
+WORDS = ("hostel", "fee", "library", "timings", "placement", "record")
+
+
+def embed_documents(texts):
+    # One dimension per keyword: a span is similar to a query sharing its words.
+    return [[text.lower().count(word) for word in WORDS] for text in texts]
+
+
+def query(text):
+    return embed_documents([text])[0]
+
+
+def doc(text, source):
+    return Document(page_content=text, metadata={"source_url": source})
+
+
+def long_sentence(topic, words=120):
+    return f"The {topic} " + " ".join(["details"] * words) + "."
+
+
+def test_every_document_keeps_source_and_best_span():
+    docs = [
+        doc(" ".join(long_sentence("hostel fee") for _ in range(6)), "https://www.nitt.edu/hostel"),
+        doc(" ".join(long_sentence("library timings") for _ in range(6)), "https://www.nitt.edu/library"),
+        doc(" ".join(long_sentence("placement record") for _ in range(6)), "https://www.nitt.edu/placements"),
+    ]
+    result = compress_docs(query("hostel fee"), docs, embed_documents, token_budget=120)
+
+    blocks = result.split("\n\n")
+    assert len(blocks) == 3
+    for block, expected in zip(blocks, docs):
+        assert block.endswith(f"Source: {expected.metadata['source_url']}")
+        assert block.startswith("Content: The ")
+    assert estimate_tokens(result) <= 120 + 10
+
+
+def test_spans_fitting_the_budget_are_whole():
+    docs = [doc("The hostel fee is listed in the circular for this year. The library opens at eight in the morning.",
+                "https://www.nitt.edu")]
+    result = compress_docs(query("hostel fee"), docs, embed_documents, token_budget=700)
+    assert result == f"Content: {docs[0].page_content}\nSource: https://www.nitt.edu"
+
+
+def test_clip_span_keeps_whole_table_rows():
+    table = "\n".join(f"| row {i} | hostel fee | 1000 |" for i in range(50))
+    clipped = clip_span(table, 40)
+    assert table.startswith(clipped)
+    assert clipped.endswith("|")
+    assert estimate_tokens(clipped) <= 40
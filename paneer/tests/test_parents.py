@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from langchain_classic.retrievers.parent_document_retriever import ParentDocumentRetriever
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.stores import InMemoryStore
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import api
+from parents import add_parents, parent_ids
+
+# Well over the 2000-character parent chunks app.py's retriever uses.
+LONG_TEXT = "\n\n".join(f"Section {i}. " + "The hostel fee circular lists the mess advance. " * 12 for i in range(8))
+
+
+def make_retriever():
+    # Same splitters as app._load_retriever, in memory.
+    return ParentDocumentRetriever(
+        vectorstore=InMemoryVectorStore(DeterministicFakeEmbedding(size=16)),
+        docstore=InMemoryStore(),
+        child_splitter=RecursiveCharacterTextSplitter(chunk_size=256, chunk_overlap=32),
+        parent_splitter=RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200),
+    )
+
+
+def child_parent_ids(retriever):
+    return {child["metadata"]["doc_id"] for child in retriever.vectorstore.store.values()}
+
+
+def test_long_document_gets_one_id_per_parent():
+    retriever = make_retriever()
+    ids = add_parents(retriever, [Document(page_content=LONG_TEXT)], "circular")
+
+    assert len(LONG_TEXT) > 2000 and len(ids) > 1
+    assert ids == ["circular"] + [f"circular#{n}" for n in range(1, len(ids))]
+    assert sorted(retriever.docstore.yield_keys()) == sorted(ids)
+    assert child_parent_ids(retriever) == set(ids)
+    assert sorted(parent_ids(retriever, "circular")) == sorted(ids)
+
+
+def test_crawled_documents_get_fresh_ids():
+    retriever = make_retriever()
+    ids = add_parents(retriever, [Document(page_content=LONG_TEXT), Document(page_content="Short page.")])
+    assert len(set(ids)) == len(ids) > 2
+    assert sorted(retriever.docstore.yield_keys()) == sorted(ids)
+
+
+@pytest.fixture
+def admin_api(monkeypatch, tmp_path):
+    # add_document appends to debug_requests.log in the working directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api, "redis_client", None)
+    retriever = make_retriever()
+    monkeypatch.setattr(api, "retriever", retriever)
+    return retriever
+
+
+def admin_document(content):
+    return api.AdminDocument(id="circular", source_url="https://www.nitt.edu", title="Hostel fees",
+                             content=content, type="manual")
+
+
+def test_add_document_over_2000_chars(admin_api):
+    result = asyncio.run(api.add_document(admin_document(LONG_TEXT)))
+    assert result["status"] == "success"
+    keys = sorted(admin_api.docstore.yield_keys())
+    assert len(keys) > 1 and "circular" in keys
+
+
+def test_update_document_replaces_every_parent(admin_api):
+    asyncio.run(api.add_document(admin_document(LONG_TEXT)))
+    asyncio.run(api.update_document("circular", admin_document("The fee is now listed on one page.")))
+    assert list(admin_api.docstore.yield_keys()) == ["circular"]
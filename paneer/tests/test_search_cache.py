@@ -0,0 +1,69 @@
+import asyncio
+
+from search_cache import SearchResultCache
+
+
+class SlowSearch:
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+        self.calls = 0
+
+    async def __call__(self, query):
+        self.calls += 1
+        self.started.set()
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return f"results for {query}", ["doc-1"], [4.2]
+
+
+def test_disconnect_cancels_the_search():
+    async def run():
+        cache = SearchResultCache()
+        search = SlowSearch()
+        caller = asyncio.create_task(cache.get_or_search("hostel fee", search))
+        await search.started.wait()
+        # What a client disconnect does to the tool call awaiting the cache.
+        caller.cancel()
+        await asyncio.sleep(0.01)
+        # Checked before asyncio.run() cancels whatever is still running.
+        return search.cancelled, dict(cache._inflight)
+
+    cancelled, inflight = asyncio.run(run())
+    assert cancelled
+    assert not inflight
+
+
+def test_search_keeps_running_while_another_caller_waits():
+    async def run():
+        cache = SearchResultCache()
+        search = SlowSearch()
+        first = asyncio.create_task(cache.get_or_search("hostel fee", search))
+        await search.started.wait()
+        second = asyncio.create_task(cache.get_or_search("Hostel fee?", search))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, search
+
+    result, search = asyncio.run(run())
+    assert result == ("results for hostel fee", ["doc-1"], [4.2])
+    assert search.calls == 1
+    assert not search.cancelled
+
+
+def test_same_query_after_a_cancelled_search_searches_again():
+    async def run():
+        cache = SearchResultCache()
+        search = SlowSearch()
+        caller = asyncio.create_task(cache.get_or_search("hostel fee", search))
+        await search.started.wait()
+        caller.cancel()
+        await asyncio.sleep(0)
+        return await cache.get_or_search("hostel fee", search), search
+
+    result, search = asyncio.run(run())
+    assert result[0] == "results for hostel fee"
+    assert search.calls == 2
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from segmenter import TagSegmenter
+
+SAMPLE = (
+    "<thinking>The user wants the hostel fee. I should search the fee circular.</thinking>"
+    "First-year students pay a hostel admission fee and a mess advance. "
+    "Note that a < b comparisons and stray tags like <b>bold</b> are not tags.<thinking>Done.</thinking>"
+    "See the [circular](https://www.nitt.edu)."
+)
+EXPECTED = [
+    ("thought_chunk", "The user wants the hostel fee. I should search the fee circular."),
+    ("text_chunk", "First-year students pay a hostel admission fee and a mess advance. "
+                   "Note that a < b comparisons and stray tags like <b>bold</b> are not tags."),
+    ("thought_chunk", "Done."),
+    ("text_chunk", "See the [circular](https://www.nitt.edu)."),
+]
+
+
+def segments(chunks):
+    segmenter = TagSegmenter({"thinking": "thought_chunk"})
+    out = []
+    for chunk in chunks:
+        out.extend(segmenter.feed(chunk))
+    out.extend(segmenter.flush())
+    return out
+
+
+def merge(segments):
+    merged = []
+    for kind, text in segments:
+        if not text:
+            continue
+        if merged and merged[-1][0] == kind:
+            merged[-1] = (kind, merged[-1][1] + text)
+        else:
+            merged.append((kind, text))
+    return merged
+
+
+def test_whole_stream():
+    assert merge(segments([SAMPLE])) == EXPECTED
+
+
+def test_every_two_way_split():
+    # Cuts each tag at every offset.
+    for i in range(1, len(SAMPLE)):
+        assert merge(segments([SAMPLE[:i], SAMPLE[i:]])) == EXPECTED, SAMPLE[max(0, i - 12):i + 12]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_rechunking(seed):
+    rng = random.Random(seed)
+    chunks = []
+    i = 0
+    while i < len(SAMPLE):
+        n = rng.randint(1, 6)
+        chunks.append(SAMPLE[i:i + n])
+        i += n
+    assert merge(segments(chunks)) == EXPECTED
+
+
+def test_one_character_chunks():
+    assert merge(segments(list(SAMPLE))) == EXPECTED
+
+
+def test_tag_split_across_chunks_is_held_back():
+    segmenter = TagSegmenter({"thinking": "thought_chunk"})
+    assert segmenter.feed("Hi <thi") == [("text_chunk", "Hi ")]
+    assert segmenter.feed("nking>hmm</thin") == [("thought_chunk", "hmm")]
+    assert segmenter.feed("king>ok") == [("text_chunk", "ok")]
+    assert segmenter.flush() == []
+
+
+def test_partial_tag_at_end_is_flushed_as_text():
+    segmenter = TagSegmenter({"thinking": "thought_chunk"})
+    assert segmenter.feed("a <thi") == [("text_chunk", "a ")]
+    assert segmenter.flush() == [("text_chunk", "<thi")]
+
+
+def test_unclosed_tag_stays_a_thought():
+    assert merge(segments(["<thinking>never ", "closed"])) == [("thought_chunk", "never closed")]
@@ -0,0 +1,62 @@
+import asyncio
+
+from working_set import WorkingSet, WorkingSetStore
+
+
+class Redis:
+    # Just enough of redis.asyncio for WorkingSetStore, recording TTLs set.
+    def __init__(self):
+        self.hashes = {}
+        self.expires = []
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        self.expires.append((key, seconds))
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def delete(self, key):
+        self.calls.append(lambda: self.redis.hashes.pop(key, None))
+
+    def hset(self, key, mapping):
+        self.calls.append(lambda: self.redis.hashes.setdefault(key, {}).update(mapping))
+
+    def expire(self, key, seconds):
+        self.calls.append(lambda: self.redis.expires.append((key, seconds)))
+
+    async def execute(self):
+        for call in self.calls:
+            call()
+
+
+def test_unchanged_set_still_refreshes_ttl():
+    redis = Redis()
+    store = WorkingSetStore(redis, ttl=60)
+
+    async def turns():
+        working_set = WorkingSet()
+        working_set.add(["doc-1"], [3.5])
+        await store.save("s", working_set)
+        # A later turn answered without searching leaves the set unchanged.
+        loaded = await store.load("s")
+        await store.save("s", loaded)
+        return loaded
+
+    loaded = asyncio.run(turns())
+    assert loaded.doc_ids() == ["doc-1"]
+    assert redis.expires == [("session:s:docs", 60), ("session:s:docs", 60)]
+
+
+def test_empty_set_is_not_written():
+    redis = Redis()
+    asyncio.run(WorkingSetStore(redis).save("s", WorkingSet()))
+    assert redis.hashes == {} and redis.expires == []
@@ -2,13 +2,16 @@
 import os
 import re
 import json
+import asyncio
 import logging
 from langchain_groq import ChatGroq
+from key_pool import get_key_pool, key_fingerprint, is_rate_limit_error, retry_after_from_error
+
+GROQ_DEFAULT_BASE_URL = "https://api.groq.com"
 
 class RagProcessor:
     def __init__(self, api_keys):
         self.api_keys = api_keys
-        self.current_key_idx = 0
         if not api_keys:
             env_keys = os.getenv("GROQ_API_KEYS")
             if env_keys:
@@ -16,35 +19,59 @@ class RagProcessor:
             else:
                  self.api_keys = []
         
-        self.llm = self._setup_llm()
+        self.key_pool = get_key_pool(self.api_keys)
+        self._llms = {}
 
-    def _setup_llm(self):
-        if not self.api_keys:
-            return None
-            
-        current_key = self.api_keys[self.current_key_idx]
-        return ChatGroq(
-            api_key=current_key, 
-            model_name="llama-3.1-8b-instant", 
-            temperature=0,
-            max_retries=0
-        )
+    def _setup_llm(self, api_key):
+        llm = self._llms.get(api_key)
+        if llm is None:
+            http_client, http_async_client = self.key_pool.http_clients(api_key)
+            llm = ChatGroq(
+                api_key=api_key, 
+                model_name="llama-3.1-8b-instant", 
+                temperature=0,
+                max_retries=0,
+                http_client=http_client,
+                http_async_client=http_async_client
+            )
+            self._llms[api_key] = llm
+        return llm
 
     def _call_llm_safe(self, prompt):
-        if not self.llm:
+        if not len(self.key_pool):
             raise ValueError("LLM not initialized. Check GROQ_API_KEYS.")
 
-        max_attempts = len(self.api_keys) * 2 
+        max_attempts = len(self.key_pool) * 2 
         
         for attempt in range(max_attempts):
+            api_key = self.key_pool.acquire()
             try:
-                return self.llm.invoke(prompt)
+                return self._setup_llm(api_key).invoke(prompt)
             except Exception as e:
-                error_msg = str(e).lower()
-                if "429" in error_msg or "rate_limit" in error_msg:
-                    logging.warning(f"Rate Limit hit on Key #{self.current_key_idx}. Rotating...")
-                    self.current_key_idx = (self.current_key_idx + 1) % len(self.api_keys)
-                    self.llm = self._setup_llm()
+                if is_rate_limit_error(e):
+                    logging.warning(f"Rate Limit hit on Key {key_fingerprint(api_key)}. Rescheduling...")
+                    self.key_pool.record_rate_limited(api_key, retry_after_from_error(e))
+                    continue
+                else:
+                    raise e
+        raise Exception("ALL API keys are currently rate-limited or exhausted.")
+
+    async def _acall_llm_safe(self, prompt):
+        # For the API: waiting for a key that is cooling down must not block
+        # the event loop.
+        if not len(self.key_pool):
+            raise ValueError("LLM not initialized. Check GROQ_API_KEYS.")
+
+        max_attempts = len(self.key_pool) * 2
+
+        for attempt in range(max_attempts):
+            api_key = await self.key_pool.aacquire()
+            try:
+                return await self._setup_llm(api_key).ainvoke(prompt)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    logging.warning(f"Rate Limit hit on Key {key_fingerprint(api_key)}. Rescheduling...")
+                    await self.key_pool.arecord_rate_limited(api_key, retry_after_from_error(e))
                     continue
                 else:
                     raise e
@@ -97,8 +124,14 @@ class RagProcessor:
             return []
 
     def process_document(self, text, url):
-        prompt = self.create_audit_prompt(text, url)
-        response = self._call_llm_safe(prompt)
+        response = self._call_llm_safe(self.create_audit_prompt(text, url))
+        return self._audit_result(response, url)
+
+    async def aprocess_document(self, text, url):
+        response = await self._acall_llm_safe(self.create_audit_prompt(text, url))
+        return self._audit_result(response, url)
+
+    def _audit_result(self, response, url):
         audit_json = self.parse_json_response(response.content)
         
         if not audit_json:
@@ -124,12 +157,11 @@ class RagProcessor:
         }
 
 class RotatingGroqChat:
-    def __init__(self, api_keys, model_name="llama-3.1-8b-instant", temperature=0, tools=None):
+    def __init__(self, api_keys, model_name="llama-3.1-8b-instant", temperature=0, tools=None, key_pool=None, base_url=None):
         self.api_keys = list(api_keys) if api_keys else []
         self.model_name = model_name
         self.temperature = temperature
         self.tools = tools or []
-        self.current_key_idx = 0
         
         if not self.api_keys:
             env_keys = os.getenv("GROQ_API_KEYS")
@@ -141,74 +173,138 @@ class RotatingGroqChat:
                         self.api_keys = env_keys.split(',')
                  else:
                     self.api_keys = []
+
+        self.key_pool = key_pool or get_key_pool(self.api_keys)
+        self.base_url = base_url or os.getenv("GROQ_API_BASE") or GROQ_DEFAULT_BASE_URL
+        # One prepared ChatGroq per key (tools already bound), built on first
+        # use and kept for the life of the process.
+        self._llms = {}
     
     def bind_tools(self, tools):
         return RotatingGroqChat(
             api_keys=self.api_keys,
             model_name=self.model_name,
             temperature=self.temperature,
-            tools=tools
+            tools=tools,
+            key_pool=self.key_pool,
+            base_url=self.base_url
         )
 
-    def _get_llm(self):
-        if not self.api_keys:
-             raise ValueError("No Groq API keys provided.")
-             
-        current_key = self.api_keys[self.current_key_idx].strip()
+    def _get_llm(self, api_key):
+        llm = self._llms.get(api_key)
+        if llm is not None:
+            return llm
+
+        http_client, http_async_client = self.key_pool.http_clients(api_key)
         llm = ChatGroq(
-            api_key=current_key,
+            api_key=api_key,
             model_name=self.model_name,
             temperature=self.temperature,
-            max_retries=0
+            max_retries=0,
+            base_url=self.base_url,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         
         if self.tools:
-            return llm.bind_tools(self.tools)
+            llm = llm.bind_tools(self.tools)
+        self._llms[api_key] = llm
         return llm
 
+    async def awarm_up(self):
+        # Builds every key's client and opens a keep-alive connection with a
+        # free /models call, so the first chat doesn't pay for TCP/TLS setup.
+        async def warm(api_key):
+            self._get_llm(api_key)
+            _, http_async_client = self.key_pool.http_clients(api_key)
+            try:
+                await http_async_client.get(
+                    f"{self.base_url.rstrip('/')}/openai/v1/models",
+                    headers={"Authorization": f"Bearer {api_key}"}
+                )
+            except Exception as e:
+                logging.warning(f"Warm-up failed for Key {key_fingerprint(api_key)}: {e}")
+
+        await asyncio.gather(*[warm(k) for k in self.key_pool.api_keys])
+
+    def _on_error(self, method, attempt, api_key, e):
+        logging.warning(f"Error in {method} attempt {attempt}: {e}")
+        if not is_rate_limit_error(e):
+            raise e
+        logging.warning(f"Rate Limit hit on Key {key_fingerprint(api_key)}. Rescheduling...")
+        self.key_pool.record_rate_limited(api_key, retry_after_from_error(e))
+
+    async def _aon_error(self, method, attempt, api_key, e):
+        logging.warning(f"Error in {method} attempt {attempt}: {e}")
+        if not is_rate_limit_error(e):
+            raise e
+        logging.warning(f"Rate Limit hit on Key {key_fingerprint(api_key)}. Rescheduling...")
+        await self.key_pool.arecord_rate_limited(api_key, retry_after_from_error(e))
+
     def stream(self, input, config=None, **kwargs):
-        if not self.api_keys:
+        if not len(self.key_pool):
              raise ValueError("No Groq API keys available to stream.")
 
-        max_attempts = len(self.api_keys) * 2
+        max_attempts = len(self.key_pool) * 2
         
         for attempt in range(max_attempts):
+            api_key = self.key_pool.acquire()
             try:
-                llm = self._get_llm()
+                llm = self._get_llm(api_key)
                 for chunk in llm.stream(input, config=config, **kwargs):
                     yield chunk
                 return
-                
             except Exception as e:
-                logging.warning(f"Error in stream attempt {attempt}: {e}")
-                error_msg = str(e).lower()
-                if "429" in error_msg or "rate_limit" in error_msg or "too many requests" in error_msg:
-                    logging.warning(f"Rate Limit hit on Key #{self.current_key_idx}. Rotating...")
-                    self.current_key_idx = (self.current_key_idx + 1) % len(self.api_keys)
-                    continue
-                else:
-                    raise e
+                self._on_error("stream", attempt, api_key, e)
                     
         raise Exception("ALL API keys are currently rate-limited or exhausted.")
 
     def invoke(self, input, config=None, **kwargs):
-        if not self.api_keys:
+        if not len(self.key_pool):
              raise ValueError("No Groq API keys available to invoke.")
 
-        max_attempts = len(self.api_keys) * 2
+        max_attempts = len(self.key_pool) * 2
         
         for attempt in range(max_attempts):
+            api_key = self.key_pool.acquire()
             try:
-                llm = self._get_llm()
+                llm = self._get_llm(api_key)
                 return llm.invoke(input, config=config, **kwargs)
-                
             except Exception as e:
-                logging.warning(f"Error in invoke attempt {attempt}: {e}")
-                error_msg = str(e).lower()
-                if "429" in error_msg or "rate_limit" in error_msg or "too many requests" in error_msg:
-                    logging.warning(f"Rate Limit hit on Key #{self.current_key_idx}. Rotating...")
-                    self.current_key_idx = (self.current_key_idx + 1) % len(self.api_keys)
-                    continue
-                else:
-                    raise e
+                self._on_error("invoke", attempt, api_key, e)
+
+        raise Exception("ALL API keys are currently rate-limited or exhausted.")
+
+    async def astream(self, input, config=None, **kwargs):
+        if not len(self.key_pool):
+             raise ValueError("No Groq API keys available to stream.")
+
+        max_attempts = len(self.key_pool) * 2
+
+        for attempt in range(max_attempts):
+            api_key = await self.key_pool.aacquire()
+            try:
+                llm = self._get_llm(api_key)
+                async for chunk in llm.astream(input, config=config, **kwargs):
+                    yield chunk
+                return
+            except Exception as e:
+                await self._aon_error("astream", attempt, api_key, e)
+
+        raise Exception("ALL API keys are currently rate-limited or exhausted.")
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if not len(self.key_pool):
+             raise ValueError("No Groq API keys available to invoke.")
+
+        max_attempts = len(self.key_pool) * 2
+
+        for attempt in range(max_attempts):
+            api_key = await self.key_pool.aacquire()
+            try:
+                llm = self._get_llm(api_key)
+                return await llm.ainvoke(input, config=config, **kwargs)
+            except Exception as e:
+                await self._aon_error("ainvoke", attempt, api_key, e)
+
         raise Exception("ALL API keys are currently rate-limited or exhausted.")
@@ -8,6 +8,8 @@ from app import get_retriever
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 from utils import RagProcessor
+from index_versions import record_document_changes, record_index_write
+from parents import add_parents, parent_ids, delete_parents
 
 load_dotenv()
 
@@ -30,7 +32,7 @@ def get_redis_client():
         logger.error(f"Failed to connect to Redis: {e}")
         return None
 
-def process_event(event, retriever):
+def process_event(event, retriever, redis_client=None):
     if not retriever:
         logger.error("Retriever is not initialized. Skipping event.")
         return
@@ -45,16 +47,16 @@ def process_event(event, retriever):
 
         logger.info(f"Processing {event_type} event for article {article_id}")
 
-        store = retriever.docstore
-        
+        old_ids = [article_id]
         try:
-            id_key = getattr(retriever, "id_key", "doc_id")
-            retriever.vectorstore.delete(where={id_key: article_id})
-            store.mdelete([article_id])
+            old_ids = parent_ids(retriever, article_id)
+            delete_parents(retriever, old_ids)
             logger.info(f"Cleaned up existing data for {article_id}")
         except Exception as e:
             logger.warning(f"Cleanup failed (might be new doc): {e}")
 
+        record_document_changes(redis_client, old_ids)
+
         if event_type == "delete":
             logger.info(f"Deleted article {article_id} from RAG.")
             return
@@ -88,7 +90,8 @@ def process_event(event, retriever):
 
             doc = Document(page_content=content, metadata=metadata)
             
-            retriever.add_documents([doc], ids=[article_id])
+            ids = add_parents(retriever, [doc], article_id)
+            record_index_write(redis_client, ids)
             logger.info(f"Indexed article {article_id} successfully.")
 
     except Exception as e:
@@ -119,7 +122,7 @@ def main():
                 _, data = result
                 try:
                     event = json.loads(data)
-                    process_event(event, retriever)
+                    process_event(event, retriever, redis_client)
                 except json.JSONDecodeError:
                     logger.error(f"Failed to decode JSON: {data}")
                 except Exception as e:
@@ -0,0 +1,81 @@
+import os
+import time
+from session_store import SESSION_TTL_SECONDS
+
+WORKING_SET_ENABLED = os.getenv("WORKING_SET_ENABLED", "true").lower() == "true"
+WORKING_SET_MAX_DOCS = int(os.getenv("WORKING_SET_MAX_DOCS", 12))
+# CrossEncoder score (ms-marco logits) a remembered parent needs against the
+# new query for the search to be answered from the working set alone.
+WORKING_SET_MIN_SCORE = float(os.getenv("WORKING_SET_MIN_SCORE", 3.0))
+
+
+class WorkingSet:
+    """Parent doc IDs a session's searches returned recently, with their last
+    CrossEncoder score and when they were last returned."""
+
+    def __init__(self, entries=None, max_docs=WORKING_SET_MAX_DOCS):
+        self.entries = entries or {}
+        self.max_docs = max_docs
+        self.changed = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def doc_ids(self):
+        # Most recently returned first, best score first within a search.
+        return sorted(self.entries, key=lambda d: (self.entries[d][1], self.entries[d][0]), reverse=True)
+
+    def add(self, doc_ids, scores=None):
+        now = time.time()
+        scores = scores or [None] * len(doc_ids)
+        for doc_id, score in zip(doc_ids, scores):
+            if not doc_id:
+                continue
+            if score is None:
+                score = self.entries.get(doc_id, (0.0, 0))[0]
+            self.entries[doc_id] = (float(score), now)
+            self.changed = True
+        for doc_id in self.doc_ids()[self.max_docs:]:
+            del self.entries[doc_id]
+
+
+class WorkingSetStore:
+    """Session working sets as Redis hashes (doc ID -> "score:timestamp")
+    next to the session's history keys, expiring with them."""
+
+    def __init__(self, redis_client, ttl=SESSION_TTL_SECONDS, max_docs=WORKING_SET_MAX_DOCS):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_docs = max_docs
+
+    def key(self, session_id):
+        return f"session:{session_id}:docs"
+
+    async def load(self, session_id):
+        entries = {}
+        for doc_id, value in (await self.redis.hgetall(self.key(session_id))).items():
+            doc_id = doc_id.decode() if isinstance(doc_id, bytes) else doc_id
+            value = value.decode() if isinstance(value, bytes) else value
+            try:
+                score, seen_at = value.split(":")
+                entries[doc_id] = (float(score), float(seen_at))
+            except ValueError:
+                continue
+        return WorkingSet(entries, self.max_docs)
+
+    async def save(self, session_id, working_set):
+        key = self.key(session_id)
+        if not working_set.changed:
+            # Still called every turn, so the set lives as long as the history.
+            if working_set.entries:
+                await self.redis.expire(key, self.ttl)
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(key)
+        if working_set.entries:
+            pipe.hset(key, mapping={
+                doc_id: f"{score:.4f}:{seen_at:.3f}" for doc_id, (score, seen_at) in working_set.entries.items()
+            })
+            pipe.expire(key, self.ttl)
+        await pipe.execute()
+        working_set.changed = False